@@ -0,0 +1,227 @@
+"""
+Benchmark do caminho de zonas (services/geoloc.py).
+
+Gera conjuntos sintéticos e reprodutíveis de ocorrências e mede, separadamente,
+ClusteringResult.dbscan, ClusteringResult.generate_geojson_cluster_polygons, o
+carregamento e as inserções do IncrementalClusterStore e, com --db, as consultas de Scans e o
+backend PostGIS. Para cada etapa informa tempo, pontos/s e pico de memória.
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.geoloc_benchmark --sizes 1000 10000 100000
+    python -m benchmarks.geoloc_benchmark --datasets hotspots --engines kdtree --sizes 1000000
+    python -m benchmarks.geoloc_benchmark --db --load --cleanup --sizes 50000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+import numpy as np
+
+from services import geoloc
+from services.cluster_store import CellClusters
+
+
+# Célula de 0.1° no centro de São Paulo, no formato de Occurrence.coordinates: [x, y]
+CELL_X = -46.7
+CELL_Y = -23.6
+BOUNDS = (CELL_X, CELL_Y, CELL_X + geoloc.GRID_SIZE, CELL_Y + geoloc.GRID_SIZE)
+
+# Acima destes tamanhos os engines quadráticos levam horas
+ENGINE_MAX_POINTS = {
+    "python": 5_000,
+    "numpy": 50_000,
+    "kdtree": None,
+}
+
+
+def uniform_points(n: int, rng: np.random.Generator, bounds=BOUNDS) -> np.ndarray:
+    min_x, min_y, max_x, max_y = bounds
+    return np.column_stack((rng.uniform(min_x, max_x, n), rng.uniform(min_y, max_y, n)))
+
+
+def hotspot_points(n: int, rng: np.random.Generator, bounds=BOUNDS, hotspots: int = 20, background: float = 0.2) -> np.ndarray:
+    """Manchas gaussianas de tamanhos variados sobre um fundo uniforme."""
+    min_x, min_y, max_x, max_y = bounds
+    n_background = int(n * background)
+    n_hotspots = n - n_background
+
+    centers = uniform_points(hotspots, rng, bounds)
+    sigmas = rng.uniform(0.001, 0.006, hotspots)
+    weights = rng.dirichlet(np.ones(hotspots))
+    which = rng.choice(hotspots, size=n_hotspots, p=weights)
+
+    points = centers[which] + rng.normal(0, 1, (n_hotspots, 2)) * sigmas[which, None]
+    points = np.vstack((points, uniform_points(n_background, rng, bounds)))
+    return np.clip(points, [min_x, min_y], [max_x, max_y])
+
+
+def corridor_points(n: int, rng: np.random.Generator, bounds=BOUNDS, corridors: int = 8, width: float = 0.0005) -> np.ndarray:
+    """Pontos ao longo de avenidas (segmentos) com um pequeno desvio lateral."""
+    min_x, min_y, max_x, max_y = bounds
+    starts = uniform_points(corridors, rng, bounds)
+    ends = uniform_points(corridors, rng, bounds)
+    which = rng.integers(0, corridors, n)
+    t = rng.uniform(0, 1, n)[:, None]
+
+    direction = ends[which] - starts[which]
+    length = np.linalg.norm(direction, axis=1, keepdims=True)
+    normal = np.column_stack((-direction[:, 1], direction[:, 0])) / np.where(length == 0, 1, length)
+
+    points = starts[which] + t * direction + normal * rng.normal(0, width, (n, 1))
+    return np.clip(points, [min_x, min_y], [max_x, max_y])
+
+
+DATASETS = {
+    "uniform": uniform_points,
+    "hotspots": hotspot_points,
+    "corridors": corridor_points,
+}
+
+
+def generate(dataset: str, n: int, seed: int) -> np.ndarray:
+    return DATASETS[dataset](n, np.random.default_rng(seed))
+
+
+def measure(func, *args, **kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def report(rows: list, dataset: str, n: int, engine: str, stage: str, elapsed: float, peak: int, extra: str = ""):
+    row = {
+        "dataset": dataset,
+        "points": n,
+        "engine": engine,
+        "stage": stage,
+        "seconds": round(elapsed, 4),
+        "points_per_second": round(n / elapsed) if elapsed > 0 else None,
+        "peak_mb": round(peak / 1_000_000, 2),
+        "extra": extra,
+    }
+    rows.append(row)
+    print("{dataset:<10} {points:>9} {engine:<8} {stage:<22} {seconds:>10.4f}s {points_per_second:>12} pts/s {peak_mb:>9.2f} MB  {extra}".format(**row), flush=True)
+
+
+def bench_clustering(rows: list, dataset: str, points: np.ndarray, engines: list, eps: float, min_samples: int, inserts: int = 0):
+    n = len(points)
+    for engine in engines:
+        limit = ENGINE_MAX_POINTS.get(engine)
+        if limit is not None and n > limit:
+            print("{:<10} {:>9} {:<8} skipped (limit {} points)".format(dataset, n, engine, limit), flush=True)
+            continue
+
+        clustering = geoloc.ClusteringResult(engine)
+        labels, elapsed, peak = measure(clustering.dbscan, points, eps, min_samples)
+        report(rows, dataset, n, engine, "dbscan", elapsed, peak, "clusters={}".format(max(labels, default=0)))
+
+        features, elapsed, peak = measure(clustering.generate_geojson_cluster_polygons, points, eps, min_samples)
+        report(rows, dataset, n, engine, "geojson_cluster_polygons", elapsed, peak, "features={}".format(len(features)))
+
+    cell, elapsed, peak = measure(CellClusters, points, eps, min_samples)
+    report(rows, dataset, n, "store", "cluster_store_load", elapsed, peak, "clusters={}".format(len(cell.hulls)))
+
+    if inserts and n > inserts:
+        # Carrega n - inserts pontos e aplica o resto um a um, como em add_occurrence
+        cell = CellClusters(points[:n - inserts], eps, min_samples)
+        _, elapsed, peak = measure(lambda: [cell.insert(point) for point in points[n - inserts:]])
+        report(rows, dataset, inserts, "store", "cluster_store_insert", elapsed, peak, "cell={} per_insert_ms={:.3f}".format(n, elapsed * 1000 / inserts))
+
+
+def load_points(db, dataset: str, points: np.ndarray, chunk_size: int = 10_000):
+    from models import models
+    from services import rollups
+
+    table = models.Occurrence.__table__
+    for start in range(0, len(points), chunk_size):
+        chunk = points[start:start + chunk_size]
+        db.execute(table.insert(), [
+            {
+                "description": "benchmark:{}".format(dataset),
+                "type": models.Occurrence.OccurrenceType.THEFT,
+                "coordinates": [float(x), float(y)],
+                "local": "SRID=4326;POINT({} {})".format(x, y),
+                "shift": models.Occurrence.ShiftOptions.NIGHT,
+            }
+            for x, y in chunk.tolist()
+        ])
+    db.commit()
+    # O insert direto não passa por services.rollups: sem o rebuild, zona limpa e heatmap mediriam tabela vazia
+    rollups.rebuild(db.get_bind())
+
+
+def cleanup_points(db):
+    from models import models
+    from services import rollups
+
+    db.query(models.Occurrence).filter(models.Occurrence.description.like("benchmark:%")).delete(synchronize_session=False)
+    db.commit()
+    rollups.rebuild(db.get_bind())
+
+
+def bench_scans(rows: list, db, dataset: str, n: int, eps: float, min_samples: int):
+    scans = geoloc.Scans(db)
+    bbox = geoloc.cell_bbox(CELL_Y, CELL_X)
+    center = [CELL_Y + geoloc.GRID_SIZE / 2, CELL_X + geoloc.GRID_SIZE / 2]
+
+    points, elapsed, peak = measure(scans.remote_scan, bbox=bbox)
+    report(rows, dataset, n, "db", "scans_remote_scan", elapsed, peak, "rows={}".format(len(points)))
+
+    points, elapsed, peak = measure(scans.user_location, base_location=center, radius_meters=1000)
+    report(rows, dataset, n, "db", "scans_user_location", elapsed, peak, "rows={}".format(len(points)))
+
+    postgis = geoloc.PostgisClusteringResult(db)
+    (point_count, features), elapsed, peak = measure(postgis.remote_scan, bbox=bbox, reference_lat=center[0], eps=eps, min_samples=min_samples)
+    report(rows, dataset, n, "postgis", "postgis_remote_scan", elapsed, peak, "features={}".format(len(features)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do clustering de zonas")
+    parser.add_argument("--datasets", nargs="+", choices=sorted(DATASETS), default=sorted(DATASETS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1_000, 10_000, 100_000])
+    parser.add_argument("--engines", nargs="+", choices=geoloc.ClusteringResult.ENGINES, default=list(geoloc.ClusteringResult.ENGINES))
+    parser.add_argument("--eps", type=float, default=1, help="raio em km, como em /remote-zones")
+    parser.add_argument("--min-samples", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--inserts", type=int, default=200, help="inserções medidas no cluster_store por célula")
+    parser.add_argument("--db", action="store_true", help="mede também Scans e o backend PostGIS no banco configurado")
+    parser.add_argument("--load", action="store_true", help="com --db, insere os pontos sintéticos antes de medir")
+    parser.add_argument("--cleanup", action="store_true", help="com --db, remove os pontos sintéticos ao final")
+    parser.add_argument("--json", help="grava os resultados neste arquivo")
+    args = parser.parse_args()
+
+    db = None
+    if args.db:
+        from database import SessionLocal
+        db = SessionLocal()
+
+    rows = []
+    try:
+        for dataset in args.datasets:
+            for n in args.sizes:
+                points = generate(dataset, n, args.seed)
+                bench_clustering(rows, dataset, points, args.engines, args.eps, args.min_samples, args.inserts)
+
+                if db is not None:
+                    if args.load:
+                        cleanup_points(db)
+                        _, elapsed, peak = measure(load_points, db, dataset, points)
+                        report(rows, dataset, n, "db", "load", elapsed, peak)
+                    bench_scans(rows, db, dataset, n, args.eps, args.min_samples)
+    finally:
+        if db is not None:
+            if args.cleanup:
+                cleanup_points(db)
+            db.close()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
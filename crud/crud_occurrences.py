@@ -1,48 +1,67 @@
+import json
+import base64
+from typing import AsyncIterator, List, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
+from sqlalchemy import select, insert, update, func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import models
 from schemas import schemas
 from geoalchemy2 import WKTElement
 from crud import crud_user
 from fastapi import HTTPException
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from services.singleton.log import logger
+from services import geoloc, rollups
 from services.utils import determine_shift
+from services.singleton.cluster_store import cluster_store
+from services.singleton.user_cache import user_cache
+from services.singleton.zone_cache import zone_cache
+from fastapi.concurrency import run_in_threadpool
 
 
 TAG = "Occurrences_CRUD ->"
 
-def get_occurrences(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Occurrence).offset(skip).limit(limit).all()
+def encode_cursor(occurrence) -> str:
+    raw = "{}|{}".format(occurrence.created_at.isoformat(), occurrence.id)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
 
-def create_occurrence_and_user_occurrence(db: Session, occurrence_data: schemas.OccurrenceCreate, uuid:str):
-    user = crud_user.get_user(db, uuid)
-    now = datetime.now(timezone.utc)
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, occurrence_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(occurrence_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-    if not user:
-        logger.error("{} User not found uuid: {}".format(TAG, uuid))
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    logger.info("{} User {} trying to create occurrence at {}".format(TAG, user.username, now))
-    user_limit = (
-        db.query(func.count(models.UserOccurrence.occurrence_id))
-        .filter(
-            models.UserOccurrence.user_id == user.id,
-            extract("year", models.UserOccurrence.created_at) == now.year,
-            extract("month", models.UserOccurrence.created_at) == now.month,
-            models.UserOccurrence.deleted_at.is_(None)
-        )
-        .scalar()
-    )
+def occurrences_statement(
+    columns=None,
+    cursor: Optional[Tuple[datetime, int]] = None,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    raw_occurrence_types: List[str] = [],
+    raw_shifts: List[str] = []
+):
+    """
+    Ocorrências da mais nova para a mais antiga, em (created_at, id) e por keyset: a página
+    seguinte começa depois do cursor, já decodificado por decode_cursor. bbox é
+    (min_x, min_y, max_x, max_y) em Occurrence.coordinates.
+    """
+    statement = select(*columns) if columns is not None else select(models.Occurrence)
+    if cursor:
+        created_at, occurrence_id = cursor
+        statement = statement.where(tuple_(models.Occurrence.created_at, models.Occurrence.id) < tuple_(created_at, occurrence_id))
+    if bbox:
+        statement = statement.where(models.Occurrence.local.ST_Within(func.ST_MakeEnvelope(*bbox, 4326)))
 
-    if user_limit >=10:
-        logger.error("{} User {} has reached the limit of 10 occurrences per month".format(TAG, user.username))
-        raise HTTPException(status_code=403, detail="User has reached the limit of 10 occurrences per month")
-    
+    statement = geoloc.apply_occurrence_filters(statement, raw_occurrence_types, raw_shifts)
+    return statement.order_by(models.Occurrence.created_at.desc(), models.Occurrence.id.desc())
+
+def get_occurrences(db: Session, limit: int = 100, **filters):
+    return db.scalars(occurrences_statement(**filters).limit(limit)).all()
+
+def build_occurrence(occurrence_data: schemas.OccurrenceCreate) -> models.Occurrence:
     point = f"POINT({occurrence_data.local[0]} {occurrence_data.local[1]})"
 
     shift = determine_shift(occurrence_data.event_datetime)
-    db_occurrence = models.Occurrence(
+    return models.Occurrence(
         description=occurrence_data.description,
         type=occurrence_data.type,
         local=WKTElement(point, srid=4326),
@@ -51,24 +70,130 @@ def create_occurrence_and_user_occurrence(db: Session, occurrence_data: schemas.
         shift=shift
     )
 
-    db.add(db_occurrence)
+def user_occurrence_statement(user_id: int, occurrence_id: int):
+    return (
+        insert(models.UserOccurrence)
+        .values(user_id=user_id, occurrence_id=occurrence_id)
+        .returning(models.UserOccurrence.id)
+    )
+
+def occurrence_rollup(occurrence_data: schemas.OccurrenceCreate, db_occurrence: models.Occurrence) -> List[dict]:
+    x, y = occurrence_data.local[0], occurrence_data.local[1]
+    return rollups.increments([(x, y, db_occurrence.type, db_occurrence.shift)])
+
+def soft_delete_occurrence(db: Session, occurrence_id: int):
+    """
+    Marca a ocorrência e o vínculo como removidos, devolve a contribuição à cota do mês
+    e ao contador do usuário e tira a ocorrência dos rollups, numa transação.
+    """
+    now = datetime.now(timezone.utc)
+    occurrence = db.execute(
+        update(models.Occurrence)
+        .where(models.Occurrence.id == occurrence_id, models.Occurrence.deleted_at.is_(None))
+        .values(deleted_at=now)
+        .returning(models.Occurrence.coordinates, models.Occurrence.type, models.Occurrence.shift)
+    ).first()
+
+    if not occurrence:
+        logger.error("{} Occurrence not found id: {}".format(TAG, occurrence_id))
+        raise HTTPException(status_code=404, detail="Occurrence not found")
+
+    links = db.execute(
+        update(models.UserOccurrence)
+        .where(models.UserOccurrence.occurrence_id == occurrence_id, models.UserOccurrence.deleted_at.is_(None))
+        .values(deleted_at=now)
+        .returning(models.UserOccurrence.user_id, models.UserOccurrence.created_at)
+    ).all()
+
+    user_uuids = []
+    for link in links:
+        # A cota devolvida é a do mês em que o vínculo foi criado (a reservada no envio)
+        created_at = link.created_at.astimezone(timezone.utc)
+        db.execute(crud_user.release_contribution_statement(link.user_id, date(created_at.year, created_at.month, 1)))
+        user_uuid = db.scalar(crud_user.decrement_contributions_statement(link.user_id))
+        if user_uuid is not None:
+            user_uuids.append(user_uuid)
+
+    x, y = occurrence.coordinates[0], occurrence.coordinates[1]
+    db.execute(rollups.upsert_statement(), rollups.increments([(x, y, occurrence.type, occurrence.shift)], delta=-1))
     db.commit()
-    db.refresh(db_occurrence)
+    logger.info("{} Occurrence {} deleted".format(TAG, occurrence_id))
+
+    for user_uuid in user_uuids:
+        user_cache.invalidate(user_uuid)
+    # A célula volta a ser carregada do banco, já sem o ponto
+    cluster_store.discard_occurrence(occurrence.coordinates)
+    zone_cache.invalidate_occurrence(occurrence.coordinates)
+
 
+# Versões async, para as rotas que usam database.get_async_db
+
+async def get_occurrences_async(db: AsyncSession, limit: int = 100, **filters):
+    result = await db.scalars(occurrences_statement(**filters).limit(limit))
+    return result.all()
+
+EXPORT_COLUMNS = (
+    models.Occurrence.id,
+    models.Occurrence.uuid,
+    models.Occurrence.description,
+    models.Occurrence.type,
+    models.Occurrence.coordinates,
+    models.Occurrence.shift,
+    models.Occurrence.event_datetime,
+    models.Occurrence.created_at,
+)
+
+async def export_occurrences_ndjson(db: AsyncSession, batch_size: int = 1000, **filters) -> AsyncIterator[str]:
+    """Uma ocorrência JSON por linha, lidas por um cursor no servidor em lotes de batch_size."""
+    statement = occurrences_statement(columns=EXPORT_COLUMNS, **filters).execution_options(yield_per=batch_size)
+    result = await db.stream(statement)
+    async for rows in result.partitions():
+        yield "".join(
+            json.dumps({
+                "id": row.id,
+                "uuid": str(row.uuid),
+                "description": row.description,
+                "type": row.type.value,
+                "coordinates": row.coordinates,
+                "shift": row.shift.value,
+                "event_datetime": row.event_datetime.isoformat() if row.event_datetime else None,
+                "created_at": row.created_at.isoformat(),
+            }) + "\n"
+            for row in rows
+        )
+
+async def create_occurrence_and_user_occurrence_async(db: AsyncSession, occurrence_data: schemas.OccurrenceCreate, uuid: str):
+    # Uma única transação: cota, ocorrência, vínculo e contador do usuário entram juntos ou nada entra
+    user = (await db.execute(crud_user.user_identity_statement(uuid))).first()
+    now = datetime.now(timezone.utc)
+
+    if not user:
+        logger.error("{} User not found uuid: {}".format(TAG, uuid))
+        raise HTTPException(status_code=404, detail="User not found")
+
+    logger.info("{} User {} trying to create occurrence at {}".format(TAG, user.username, now))
+    if await db.scalar(crud_user.reserve_contribution_statement(user.id)) is None:
+        logger.error("{} User {} has reached the limit of 10 occurrences per month".format(TAG, user.username))
+        await db.rollback()
+        raise HTTPException(status_code=403, detail="User has reached the limit of 10 occurrences per month")
+
+    db_occurrence = build_occurrence(occurrence_data)
+    db.add(db_occurrence)
+    await db.flush()
     logger.info("{} User {} created occurrence {}".format(TAG, user.username, db_occurrence.id))
+
     # cria o registro de user_occurrence
-    db_user_occurrence = models.UserOccurrence(
-        user_id=user.id,
-        occurrence_id=db_occurrence.id
-    )
-    db.add(db_user_occurrence)
-    db.commit()
-    db.refresh(db_user_occurrence)
+    user_occurrence_id = await db.scalar(user_occurrence_statement(user.id, db_occurrence.id))
+    contributions = await db.scalar(crud_user.increment_contributions_statement(user.id))
+    await db.execute(rollups.upsert_statement(), occurrence_rollup(occurrence_data, db_occurrence))
 
-    user.contributions += 1
-    db.commit()
-    db.refresh(user)
-    logger.info("{} User {} created user_occurrence {}".format(TAG, user.username, db_user_occurrence.id))
+    await db.commit()
+    user_cache.invalidate(uuid)
+    logger.info("{} User {} created user_occurrence {} ({} contributions)".format(TAG, user.username, user_occurrence_id, contributions))
+
+    # Vizinhança e hull da célula (sob o lock do cluster_store) e Redis fora do event loop
+    await run_in_threadpool(cluster_store.add_occurrence, db_occurrence.coordinates)
+    await run_in_threadpool(zone_cache.invalidate_occurrence, db_occurrence.coordinates)
 
     db_occurrence.local  = occurrence_data.local
-    return db_occurrence
\ No newline at end of file
+    return db_occurrence
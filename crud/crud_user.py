@@ -1,14 +1,21 @@
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import models
 from schemas import schemas
 from services.security import hash_password, validate_password, check_current_password
 from services.singleton.log import logger
-from datetime import datetime, timezone
-from sqlalchemy import func, extract
+from services.singleton.user_cache import user_cache
+from datetime import datetime, timezone, date
+from typing import Optional
+from types import SimpleNamespace
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert
 
 
 TAG = "User_CRUD ->"
 
+MONTHLY_CONTRIBUTION_LIMIT = 10
+
 
 def get_users(db: Session, skip: int = 0, limit: int = 100):
     logger.info("{} User trying to get users".format(TAG))
@@ -34,30 +41,104 @@ def create_user(db: Session, user: schemas.UserCreate):
     logger.info("{} {} successfully registered in application".format(TAG, user.username))
     return db_user
 
-def get_user(db: Session, uuid : str):
-    logger.info(f"{TAG} Getting user by uuid {uuid}")
-    user = db.query(models.User).filter(models.User.uuid == uuid).first()
-
-    if not user:
-        return None 
+def current_month() -> date:
     now = datetime.now(timezone.utc)
+    return date(now.year, now.month, 1)
 
-    month_contrib = (
-        db.query(func.count(models.UserOccurrence.occurrence_id))
-        .filter(
-            models.UserOccurrence.user_id == user.id,
-            extract("year", models.UserOccurrence.created_at) == now.year,
-            extract("month", models.UserOccurrence.created_at) == now.month,
-            models.UserOccurrence.deleted_at.is_(None)
+def month_contributions_statement(user_id: int):
+    # Leitura pela chave primária de user_monthly_quotas, sem varrer o histórico
+    return (
+        select(models.UserMonthlyQuota.contributions)
+        .where(
+            models.UserMonthlyQuota.user_id == user_id,
+            models.UserMonthlyQuota.month == current_month()
         )
-        .scalar()
     )
-    remaining = 10 - month_contrib
+
+def reserve_contribution_statement(user_id: int):
+    """
+    Soma 1 ao contador do mês somente se o usuário ainda tiver cota. Sem linha no
+    RETURNING, o limite foi atingido. Deve rodar na mesma transação do insert da ocorrência;
+    o lock da linha serializa envios simultâneos do mesmo usuário.
+    """
+    quota = models.UserMonthlyQuota.__table__
+    statement = insert(quota).values(user_id=user_id, month=current_month(), contributions=1)
+    return statement.on_conflict_do_update(
+        index_elements=[quota.c.user_id, quota.c.month],
+        set_={"contributions": quota.c.contributions + 1, "updated_at": func.now()},
+        where=quota.c.contributions < MONTHLY_CONTRIBUTION_LIMIT
+    ).returning(quota.c.contributions)
+
+def release_contribution_statement(user_id: int, month: date):
+    """
+    Devolve 1 ao contador do mês em que a contribuição foi reservada (remoção da
+    ocorrência). Deve rodar na mesma transação do soft-delete.
+    """
+    quota = models.UserMonthlyQuota.__table__
+    return (
+        update(quota)
+        .where(quota.c.user_id == user_id, quota.c.month == month)
+        .values(contributions=func.greatest(quota.c.contributions - 1, 0), updated_at=func.now())
+    )
+
+def user_identity_statement(uuid: str):
+    return select(models.User.id, models.User.username).where(models.User.uuid == uuid)
+
+def increment_contributions_statement(user_id: int):
+    # Incremento atômico no banco, sem ler e regravar o valor pelo ORM
+    return (
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(contributions=models.User.contributions + 1)
+        .returning(models.User.contributions)
+    )
+
+def decrement_contributions_statement(user_id: int):
+    return (
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(contributions=func.greatest(models.User.contributions - 1, 0))
+        .returning(models.User.uuid)
+    )
+
+def set_remaining(user: models.User, month_contrib: Optional[int]):
+    remaining = MONTHLY_CONTRIBUTION_LIMIT - (month_contrib or 0)
     if remaining < 0:
         remaining = 0
     user.remaining = remaining
     return user
 
+def get_user(db: Session, uuid : str):
+    logger.info(f"{TAG} Getting user by uuid {uuid}")
+    user = db.query(models.User).filter(models.User.uuid == uuid).first()
+
+    if not user:
+        return None 
+
+    month_contrib = db.scalar(month_contributions_statement(user.id))
+    return set_remaining(user, month_contrib)
+
+def user_profile(user: models.User) -> SimpleNamespace:
+    # Cópia fora da sessão, para ser cacheada e lida depois do db.close()
+    data = {column.name: getattr(user, column.name) for column in models.User.__table__.columns if column.name != "password"}
+    return SimpleNamespace(**data, remaining=user.remaining)
+
+def get_user_cached(db: Session, uuid: str):
+    """
+    Leitura do usuário autenticado pelo user_cache; só para rotas que não alteram o usuário.
+    db precisa ser uma sessão do primário: o cache não pode ser preenchido por uma réplica atrasada.
+    """
+    profile = user_cache.get(uuid)
+    if profile is not None:
+        return profile
+
+    user = get_user(db, uuid)
+    if not user:
+        return None
+    profile = user_profile(user)
+    user_cache.set(uuid, profile)
+    return profile
+
 
 def get_user_by_email(db: Session, email: str):
     logger.info("{} Getting user by email {}".format(TAG, email))
@@ -80,6 +161,7 @@ def update_user(db: Session, uuid: str, user: schemas.UserUpdate):
     
     db.commit()
     db.refresh(db_user)
+    user_cache.invalidate(uuid)
     logger.info("{} Updated user by uuid {} data: {}".format(TAG, uuid, user))
     return db_user
 
@@ -88,21 +170,44 @@ def update_user_fcm(db: Session, uuid: str, fcm_token: str):
     db_user.phone_identifier = fcm_token
     db.commit()
     db.refresh(db_user)
+    user_cache.invalidate(uuid)
     return db_user
 
 
-def create_exclusion_request(db: Session, exclusion_request: schemas.ExclusionRequestCreate):
-    db_user = db.query(models.User).filter(models.User.email == exclusion_request.email).first()
-    db_exclusion_request = models.ExclusionRequest(
-        user_id=db_user.id,
-        reason=exclusion_request.reason
-    )
+def create_exclusion_request(db: Session, user_id: int, reason: str):
+    db_exclusion_request = models.UserExclusionRequest(user_id=user_id, reason=reason)
     db.add(db_exclusion_request)
     db.commit() 
     db.refresh(db_exclusion_request)
-    return
+    return db_exclusion_request
 def delete_user(db: Session, uuid: str):
     db_user = db.query(models.User).filter(models.User.uuid == uuid).first()
     db.delete(db_user)
     db.commit()
+    user_cache.invalidate(uuid)
     return db_user
+
+
+# Versões async, para as rotas que usam database.get_async_db
+
+async def get_user_async(db: AsyncSession, uuid: str):
+    logger.info(f"{TAG} Getting user by uuid {uuid}")
+    user = await db.scalar(select(models.User).where(models.User.uuid == uuid))
+
+    if not user:
+        return None
+
+    month_contrib = await db.scalar(month_contributions_statement(user.id))
+    return set_remaining(user, month_contrib)
+
+async def get_user_by_email_async(db: AsyncSession, email: str):
+    logger.info("{} Getting user by email {}".format(TAG, email))
+    return await db.scalar(select(models.User).where(models.User.email == email))
+
+async def create_exclusion_request_async(db: AsyncSession, user_id: int, reason: str):
+    db_exclusion_request = models.UserExclusionRequest(user_id=user_id, reason=reason)
+    db.add(db_exclusion_request)
+    await db.commit()
+    await db.refresh(db_exclusion_request)
+    logger.info("{} Exclusion request {} created for user {}".format(TAG, db_exclusion_request.id, user_id))
+    return db_exclusion_request
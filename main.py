@@ -2,14 +2,18 @@ import os
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
-from routers import user, occurrence, zones
+from routers import user, occurrence, zones, metrics, admin
 from database import Base, engine
+from services.partitions import start_partition_maintenance
+from services.singleton.tile_client import tile_client
+from services.singleton.tile_publisher import tile_publisher
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
 Base.metadata.create_all(bind=engine)
+start_partition_maintenance(engine)
 db_mode = os.getenv("DB_MODE")
 if db_mode=="prd":
     from services.rabbit.consumer import Consumer
@@ -23,6 +27,8 @@ if db_mode=="prd":
         thread = threading.Thread(target=consumer.consume, daemon=True, name="RabbitConsumer")
         thread.start()
         yield
+        await tile_client.close()
+        tile_publisher.close()
         producer.close_connection()
         print("encerrando app")
 
@@ -31,11 +37,22 @@ if db_mode=="prd":
     app.include_router(user.router, prefix="/api")
     app.include_router(occurrence.router, prefix="/api")
     app.include_router(zones.router, prefix="/api")
+    app.include_router(metrics.router, prefix="/api")
+    app.include_router(admin.router, prefix="/api")
     app.mount("/static", StaticFiles(directory="static"), name="static")
     
 else:
-    app = FastAPI()
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        yield
+        await tile_client.close()
+        tile_publisher.close()
+
+
+    app = FastAPI(lifespan=lifespan)
     app.include_router(user.router, prefix="/api")
     app.include_router(occurrence.router, prefix="/api")
     app.include_router(zones.router, prefix="/api")
+    app.include_router(metrics.router, prefix="/api")
+    app.include_router(admin.router, prefix="/api")
     app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -0,0 +1,36 @@
+"""indices espaciais em occurrences
+
+Revision ID: 3f9a1c2d7b64
+Revises: 76bc03853d0e
+Create Date: 2026-10-18 11:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c2d7b64'
+down_revision: Union[str, None] = '76bc03853d0e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY não roda dentro de transação e não bloqueia escritas na tabela
+    with op.get_context().autocommit_block():
+        # ST_Within de Scans.remote_scan
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_occurrences_local ON occurrences USING gist (local)")
+        # ST_DWithin em metros de Scans.user_location
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_occurrences_local_geography ON occurrences USING gist (geography(local))")
+    op.execute("ANALYZE occurrences")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_occurrences_local_geography")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_occurrences_local")
@@ -0,0 +1,43 @@
+"""cota mensal de contribuicoes por usuario
+
+Revision ID: 8d2e4b6f1a93
+Revises: 3f9a1c2d7b64
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2e4b6f1a93'
+down_revision: Union[str, None] = '3f9a1c2d7b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_monthly_quotas',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('contributions', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'month')
+    )
+    # Carga inicial a partir do histórico, no mesmo critério do count antigo (mês em UTC, sem soft-delete)
+    op.execute("""
+        INSERT INTO user_monthly_quotas (user_id, month, contributions)
+        SELECT user_id, date_trunc('month', created_at AT TIME ZONE 'UTC')::date, count(*)
+        FROM user_occurrences
+        WHERE deleted_at IS NULL AND user_id IS NOT NULL
+        GROUP BY 1, 2
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_monthly_quotas')
@@ -0,0 +1,110 @@
+"""particiona occurrences por mes de created_at
+
+Revision ID: b5c7e9a2d4f1
+Revises: 8d2e4b6f1a93
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5c7e9a2d4f1'
+down_revision: Union[str, None] = '8d2e4b6f1a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Meses criados à frente do mês corrente; depois disso services.partitions mantém
+MONTHS_AHEAD = 3
+
+
+def recreate_indexes() -> None:
+    op.execute("CREATE INDEX ix_occurrences_id ON occurrences (id)")
+    op.execute("CREATE INDEX idx_occurrences_local ON occurrences USING gist (local)")
+    op.execute("CREATE INDEX idx_occurrences_local_geography ON occurrences USING gist (geography(local))")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Copia a tabela inteira numa transação: rodar em janela de manutenção
+    op.execute("ALTER TABLE occurrences RENAME TO occurrences_legacy")
+    op.execute("UPDATE occurrences_legacy SET created_at = now() WHERE created_at IS NULL")
+
+    # LIKE mantém colunas, tipos e o default do id (mesma sequence)
+    op.execute("CREATE TABLE occurrences (LIKE occurrences_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)")
+    op.execute("ALTER TABLE occurrences ALTER COLUMN created_at SET NOT NULL")
+
+    op.execute(f"""
+        DO $$
+        DECLARE
+            first_month date := date_trunc('month', coalesce((SELECT min(created_at) FROM occurrences_legacy), now()) AT TIME ZONE 'UTC')::date;
+            last_month date := (date_trunc('month', now() AT TIME ZONE 'UTC') + interval '{MONTHS_AHEAD} months')::date;
+            month_start date := first_month;
+        BEGIN
+            WHILE month_start <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF occurrences FOR VALUES FROM (%L) TO (%L)',
+                    'occurrences_' || to_char(month_start, 'YYYY_MM'),
+                    month_start || ' 00:00:00+00',
+                    (month_start + interval '1 month')::date || ' 00:00:00+00'
+                );
+                month_start := (month_start + interval '1 month')::date;
+            END LOOP;
+        END
+        $$
+    """)
+    op.execute("CREATE TABLE occurrences_default PARTITION OF occurrences DEFAULT")
+
+    op.execute("INSERT INTO occurrences SELECT * FROM occurrences_legacy")
+
+    # Uma FK não pode apontar só para id numa tabela particionada. Sem ela o banco deixa
+    # de impedir vínculos para ocorrências inexistentes; f6a8c0e2b4d5 a substitui por triggers
+    op.execute("ALTER TABLE user_occurrences DROP CONSTRAINT IF EXISTS user_occurrences_occurrence_id_fkey")
+    op.execute("""
+        DO $$
+        BEGIN
+            IF pg_get_serial_sequence('occurrences_legacy', 'id') IS NOT NULL THEN
+                EXECUTE format('ALTER SEQUENCE %s OWNED BY occurrences.id', pg_get_serial_sequence('occurrences_legacy', 'id'));
+            END IF;
+        END
+        $$
+    """)
+    op.execute("DROP TABLE occurrences_legacy")
+
+    # PK e índices depois da carga e do drop da tabela antiga, que ainda usava os mesmos nomes.
+    # Em tabela particionada a PK e os índices únicos precisam conter a chave de partição
+    op.execute("ALTER TABLE occurrences ADD PRIMARY KEY (id, created_at)")
+    recreate_indexes()
+    # O índice único em uuid não contém a chave de partição: uuid perde a unicidade no banco
+    # (f6a8c0e2b4d5 passa a garantir (uuid, created_at))
+    op.execute("CREATE INDEX ix_occurrences_uuid ON occurrences (uuid)")
+    op.execute("ANALYZE occurrences")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE occurrences RENAME TO occurrences_partitioned")
+    op.execute("CREATE TABLE occurrences (LIKE occurrences_partitioned INCLUDING DEFAULTS)")
+    op.execute("INSERT INTO occurrences SELECT * FROM occurrences_partitioned")
+    op.execute("""
+        DO $$
+        BEGIN
+            IF pg_get_serial_sequence('occurrences_partitioned', 'id') IS NOT NULL THEN
+                EXECUTE format('ALTER SEQUENCE %s OWNED BY occurrences.id', pg_get_serial_sequence('occurrences_partitioned', 'id'));
+            END IF;
+        END
+        $$
+    """)
+    op.execute("DROP TABLE occurrences_partitioned CASCADE")
+
+    op.execute("ALTER TABLE occurrences ADD PRIMARY KEY (id)")
+    recreate_indexes()
+    op.execute("CREATE UNIQUE INDEX ix_occurrences_uuid ON occurrences (uuid)")
+    op.execute("""
+        ALTER TABLE user_occurrences ADD CONSTRAINT user_occurrences_occurrence_id_fkey
+        FOREIGN KEY (occurrence_id) REFERENCES occurrences (id)
+    """)
+    op.execute("ANALYZE occurrences")
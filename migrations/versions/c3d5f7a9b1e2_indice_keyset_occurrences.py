@@ -0,0 +1,29 @@
+"""indice de keyset em occurrences
+
+Revision ID: c3d5f7a9b1e2
+Revises: b5c7e9a2d4f1
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d5f7a9b1e2'
+down_revision: Union[str, None] = 'b5c7e9a2d4f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tabela particionada não aceita CONCURRENTLY no pai; o índice é criado em cada partição
+    op.execute("CREATE INDEX IF NOT EXISTS ix_occurrences_created_at_id ON occurrences (created_at, id)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX IF EXISTS ix_occurrences_created_at_id")
@@ -0,0 +1,49 @@
+"""rollups de ocorrencias por celula
+
+Revision ID: e4f6a8c0d2b3
+Revises: c3d5f7a9b1e2
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4f6a8c0d2b3'
+down_revision: Union[str, None] = 'c3d5f7a9b1e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Mesmo valor de services.geoloc.GRID_SIZE quando a migração foi escrita
+GRID_SIZE = 0.1
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('occurrence_cell_rollups',
+    sa.Column('cell_x', sa.Integer(), nullable=False),
+    sa.Column('cell_y', sa.Integer(), nullable=False),
+    sa.Column('type', postgresql.ENUM(name='occurrencetype', create_type=False), nullable=False),
+    sa.Column('shift', postgresql.ENUM(name='shiftoptions', create_type=False), nullable=False),
+    sa.Column('occurrences', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('cell_x', 'cell_y', 'type', 'shift')
+    )
+    op.execute(f"""
+        INSERT INTO occurrence_cell_rollups (cell_x, cell_y, type, shift, occurrences)
+        SELECT floor(round((ST_X(local) / {GRID_SIZE})::numeric, 9))::int,
+               floor(round((ST_Y(local) / {GRID_SIZE})::numeric, 9))::int,
+               type, shift, count(*)
+        FROM occurrences
+        WHERE deleted_at IS NULL AND local IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('occurrence_cell_rollups')
@@ -0,0 +1,104 @@
+"""integridade de occurrences particionada
+
+Revision ID: f6a8c0e2b4d5
+Revises: e4f6a8c0d2b3
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6a8c0e2b4d5'
+down_revision: Union[str, None] = 'e4f6a8c0d2b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # b5c7e9a2d4f1 perdeu duas garantias ao particionar occurrences:
+    # - o índice único em uuid, que não pode existir sem a chave de partição. O uuid4 é
+    #   gerado pela aplicação (models.Occurrence e services.ingest) e o banco passa a
+    #   garantir (uuid, created_at); um uuid repetido em meses diferentes não é detectado.
+    # - a FK user_occurrences.occurrence_id -> occurrences.id, que exigiria a PK inteira.
+    #   Os triggers abaixo fazem o papel dela para INSERT/UPDATE/DELETE de linhas, mas não
+    #   cobrem DROP/DETACH de uma partição nem TRUNCATE (que não disparam triggers de linha)
+    op.execute("DROP INDEX IF EXISTS ix_occurrences_uuid")
+    op.execute("ALTER TABLE occurrences ADD CONSTRAINT uq_occurrences_uuid_created_at UNIQUE (uuid, created_at)")
+
+    # Usado pelo trigger de DELETE e pelo soft-delete da ocorrência
+    op.execute("CREATE INDEX IF NOT EXISTS ix_user_occurrences_occurrence_id ON user_occurrences (occurrence_id)")
+
+    # FOR KEY SHARE trava a ocorrência como a FK faria, contra um DELETE concorrente
+    op.execute("""
+        CREATE FUNCTION user_occurrences_check_occurrence() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.occurrence_id IS NULL THEN
+                RETURN NEW;
+            END IF;
+            PERFORM 1 FROM occurrences WHERE id = NEW.occurrence_id FOR KEY SHARE;
+            IF NOT FOUND THEN
+                RAISE EXCEPTION USING
+                    ERRCODE = 'foreign_key_violation',
+                    MESSAGE = 'occurrence ' || NEW.occurrence_id || ' does not exist';
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER user_occurrences_occurrence_fk
+        BEFORE INSERT OR UPDATE OF occurrence_id ON user_occurrences
+        FOR EACH ROW EXECUTE FUNCTION user_occurrences_check_occurrence()
+    """)
+
+    # Como o ON DELETE padrão (NO ACTION) da FK antiga; a remoção normal é soft-delete
+    op.execute("""
+        CREATE FUNCTION occurrences_restrict_delete() RETURNS trigger AS $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM user_occurrences WHERE occurrence_id = OLD.id) THEN
+                RAISE EXCEPTION USING
+                    ERRCODE = 'foreign_key_violation',
+                    MESSAGE = 'occurrence ' || OLD.id || ' is still referenced from user_occurrences';
+            END IF;
+            RETURN OLD;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER occurrences_user_occurrences_fk
+        BEFORE DELETE ON occurrences
+        FOR EACH ROW EXECUTE FUNCTION occurrences_restrict_delete()
+    """)
+
+    # Vínculos órfãos anteriores a esta migração não são validados pelos triggers
+    op.execute("""
+        DO $$
+        DECLARE
+            orphans bigint;
+        BEGIN
+            SELECT count(*) INTO orphans
+            FROM user_occurrences uo
+            WHERE uo.occurrence_id IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM occurrences o WHERE o.id = uo.occurrence_id);
+            IF orphans > 0 THEN
+                RAISE WARNING 'user_occurrences has % rows without an occurrence', orphans;
+            END IF;
+        END
+        $$
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS occurrences_user_occurrences_fk ON occurrences")
+    op.execute("DROP FUNCTION IF EXISTS occurrences_restrict_delete()")
+    op.execute("DROP TRIGGER IF EXISTS user_occurrences_occurrence_fk ON user_occurrences")
+    op.execute("DROP FUNCTION IF EXISTS user_occurrences_check_occurrence()")
+    op.execute("DROP INDEX IF EXISTS ix_user_occurrences_occurrence_id")
+    op.execute("ALTER TABLE occurrences DROP CONSTRAINT IF EXISTS uq_occurrences_uuid_created_at")
+    op.execute("CREATE INDEX ix_occurrences_uuid ON occurrences (uuid)")
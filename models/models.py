@@ -1,5 +1,5 @@
 import uuid as uuid_pkg
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Date, JSON, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from geoalchemy2 import Geometry
 from sqlalchemy.dialects.postgresql import UUID
@@ -54,32 +54,71 @@ class Occurrence(Base):
 
 
     __tablename__ = "occurrences"
-
-    id = Column(Integer, primary_key=True, index=True)
-    uuid = Column(UUID(as_uuid=True), default=uuid_pkg.uuid4, unique=True, index=True)
+    # Partições mensais por created_at (services/partitions.py); PK e índices únicos incluem a chave.
+    # uuid é gerado pela aplicação e o banco só garante (uuid, created_at)
+    __table_args__ = (
+        UniqueConstraint("uuid", "created_at", name="uq_occurrences_uuid_created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    uuid = Column(UUID(as_uuid=True), default=uuid_pkg.uuid4)
     description = Column(String)
     type = Column(SQLEnum(OccurrenceType), nullable=False)
     coordinates = Column(JSON, nullable=False)
     local = Column(Geometry(geometry_type='POINT', srid=4326))
     shift = Column(SQLEnum(ShiftOptions), nullable=False)
     event_datetime = Column(DateTime(timezone=True), nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     deleted_at = Column(DateTime(timezone=True), nullable=True)
 
 
+# Índice GiST sobre geography(local), usado pelo ST_DWithin em metros de Scans.user_location
+Index("idx_occurrences_local_geography", func.geography(Occurrence.local), postgresql_using="gist")
+# Paginação por keyset em GET /occurrences: ORDER BY created_at DESC, id DESC
+Index("ix_occurrences_created_at_id", Occurrence.created_at, Occurrence.id)
+
+
 class UserOccurrence(Base):
     __tablename__ = "user_occurrences"
 
     id = Column(Integer, primary_key=True, index=True)
     uuid = Column(UUID(as_uuid=True), default=uuid_pkg.uuid4, unique=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    occurrence_id = Column(Integer, ForeignKey("occurrences.id"))
+    # Sem FK: a PK de occurrences particionada é (id, created_at). Triggers da migração
+    # f6a8c0e2b4d5 validam o vínculo no lugar dela
+    occurrence_id = Column(Integer, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     deleted_at = Column(DateTime(timezone=True), nullable=True)
 
 
+class UserMonthlyQuota(Base):
+    """Contribuições do usuário no mês (month = primeiro dia, UTC), mantido junto com user_occurrences."""
+    __tablename__ = "user_monthly_quotas"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(Date, primary_key=True)
+    contributions = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class OccurrenceCellRollup(Base):
+    """
+    Ocorrências ativas por célula do grid, tipo e turno (services/rollups.py). A célula é
+    floor(coordinates / GRID_SIZE): cell_x pela posição 0 de Occurrence.coordinates, cell_y pela 1.
+    """
+    __tablename__ = "occurrence_cell_rollups"
+
+    cell_x = Column(Integer, primary_key=True)
+    cell_y = Column(Integer, primary_key=True)
+    type = Column(SQLEnum(Occurrence.OccurrenceType), primary_key=True)
+    shift = Column(SQLEnum(Occurrence.ShiftOptions), primary_key=True)
+    occurrences = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
 class UserExclusionRequest(Base):
     __tablename__ = "user_exclusion_requests"
 
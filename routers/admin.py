@@ -0,0 +1,46 @@
+import io
+import os
+import tempfile
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from crud import crud_occurrences
+from database import get_db
+from schemas import schemas
+from services import auth, ingest
+
+router = APIRouter()
+
+# Acima disso o corpo recebido vai para disco antes da carga
+INGEST_SPOOL_SIZE = int(os.getenv("INGEST_SPOOL_SIZE", 64 * 1024 * 1024))
+
+
+@router.post("/admin/occurrences/bulk", response_model=schemas.BulkIngestResponse)
+async def bulk_ingest_occurrences(
+        request: Request,
+        format: Literal["jsonl", "csv"] = Query(default="jsonl"),
+        _: None = Depends(auth.verify_admin_key)
+    ):
+    with tempfile.SpooledTemporaryFile(max_size=INGEST_SPOOL_SIZE, mode="w+b") as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+
+        stream = io.TextIOWrapper(spool, encoding="utf-8", newline="")
+        try:
+            # Validação e COPY são síncronos: rodam fora do event loop
+            return await run_in_threadpool(ingest.ingest_stream, stream, format)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.delete("/admin/occurrences/{occurrence_id}", response_model=schemas.GenericResponse)
+def delete_occurrence(
+        occurrence_id: int,
+        db: Session = Depends(get_db),
+        _: None = Depends(auth.verify_admin_key)
+    ):
+    crud_occurrences.soft_delete_occurrence(db, occurrence_id)
+    return {"message": "Occurrence deleted", "status": True}
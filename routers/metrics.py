@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends
+from database import pool_metrics, replica_router
+from services import auth
+from services.singleton.tile_publisher import tile_publisher
+from services.singleton.zone_single_flight import zone_single_flight
+
+# Internos do pool, das réplicas e das filas: só com a chave de admin
+router = APIRouter(dependencies=[Depends(auth.verify_admin_key)])
+
+
+@router.get("/metrics/db-pool")
+def get_db_pool_metrics():
+    return pool_metrics()
+
+
+@router.get("/metrics/db-replicas")
+def get_db_replica_status():
+    return replica_router.status()
+
+
+@router.get("/metrics/tile-publisher")
+def get_tile_publisher_stats():
+    return tile_publisher.stats()
+
+
+@router.get("/metrics/zone-single-flight")
+def get_zone_single_flight_stats():
+    return zone_single_flight.stats()
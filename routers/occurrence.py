@@ -1,26 +1,61 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from schemas import schemas
 from crud import crud_occurrences
-from database import SessionLocal
+from database import get_async_db, get_async_read_db, async_read_session
 from services.auth import verify_token
 
 router = APIRouter()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def occurrence_filters(
+        cursor: Optional[str] = Query(default=None, description="X-Next-Cursor of the previous page"),
+        swLat: Optional[float] = Query(default=None),
+        swLng: Optional[float] = Query(default=None),
+        neLat: Optional[float] = Query(default=None),
+        neLng: Optional[float] = Query(default=None),
+        occurrenceType: List[str] = Query(default=[]),
+        shifts: List[str] = Query(default=[]),
+    ) -> dict:
+    corners = (swLat, swLng, neLat, neLng)
+    bbox = None
+    if any(value is not None for value in corners):
+        if any(value is None for value in corners):
+            raise HTTPException(status_code=400, detail="swLat, swLng, neLat and neLng must be sent together")
+        bbox = (min(swLng, neLng), min(swLat, neLat), max(swLng, neLng), max(swLat, neLat))
+
+    # Decodificado aqui: no /export o gerador só roda depois do status 200 já ter saído
+    decoded_cursor = crud_occurrences.decode_cursor(cursor) if cursor else None
+    return {"cursor": decoded_cursor, "bbox": bbox, "raw_occurrence_types": occurrenceType, "raw_shifts": shifts}
 
 
 @router.post("/occurrences", response_model=schemas.OccurrenceResponse)
-async def create_occurrence(occurrence: schemas.OccurrenceCreate, db: Session = Depends(get_db), uuid: str = Depends(verify_token)):
-    return crud_occurrences.create_occurrence_and_user_occurrence(db, occurrence, uuid)
+async def create_occurrence(occurrence: schemas.OccurrenceCreate, db: AsyncSession = Depends(get_async_db), uuid: str = Depends(verify_token)):
+    return await crud_occurrences.create_occurrence_and_user_occurrence_async(db, occurrence, uuid)
 
 
 @router.get("/occurrences", response_model=list[schemas.OccurrenceResponse])
-async def get_occurrences(db: Session = Depends(get_db), _: str = Depends(verify_token)):
-    return crud_occurrences.get_occurrences(db)
\ No newline at end of file
+async def get_occurrences(
+        response: Response,
+        limit: int = Query(default=100, ge=1, le=1000),
+        filters: dict = Depends(occurrence_filters),
+        db: AsyncSession = Depends(get_async_read_db),
+        _: str = Depends(verify_token)
+    ):
+    occurrences = await crud_occurrences.get_occurrences_async(db, limit, **filters)
+    if len(occurrences) == limit:
+        response.headers["X-Next-Cursor"] = crud_occurrences.encode_cursor(occurrences[-1])
+    return occurrences
+
+
+@router.get("/occurrences/export")
+async def export_occurrences(filters: dict = Depends(occurrence_filters), _: str = Depends(verify_token)):
+    # A sessão é aberta no gerador: as dependências com yield fecham antes do corpo ser enviado
+    async def rows():
+        async with async_read_session() as db:
+            async for chunk in crud_occurrences.export_occurrences_ndjson(db, **filters):
+                yield chunk
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
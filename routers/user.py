@@ -1,14 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import HTMLResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 from schemas import schemas
 from crud import crud_user
 from models import models
 from services import security, auth, utils
-from database import SessionLocal
+from database import get_db, get_async_db
 from services.singleton.amazon import ses_email
 from services.singleton.hostinger import hostinger_email
+from services.singleton.user_cache import user_cache
 from services.utils import generate_token
 from services.redis.redis import save_token, get_token_data, delete_token
 from services.security import hash_password, validate_password
@@ -16,15 +18,6 @@ from services.security import hash_password, validate_password
 router=APIRouter()
 
 
-def get_db():
-    db=SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-
 @router.post("/users/register", response_model=schemas.UserResponse)
 def create_user(user: schemas.UserCreate, db: Session=Depends(get_db)):
     query=db.query(models.User).filter(models.User.email == user.email or models.User.username == user.username).first()
@@ -42,14 +35,11 @@ def create_user(user: schemas.UserCreate, db: Session=Depends(get_db)):
 
 
 @router.get("/user", response_model=schemas.UserResponse)
-def get_user(uuid: str=Depends(auth.verify_token), db: Session=Depends(get_db), _: str=Depends(auth.verify_token)):
-    user=crud_user.get_user(db, uuid)
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
+def get_user(user=Depends(auth.get_current_user)):
     return user
 
 @router.patch("/user", response_model=schemas.UserResponse)
-def update_user(user: schemas.UserUpdate, uuid: str=Depends(auth.verify_token), db: Session=Depends(get_db), _: str=Depends(auth.verify_token)):
+def update_user(user: schemas.UserUpdate, uuid: str=Depends(auth.verify_token), db: Session=Depends(get_db)):
     db_user=crud_user.get_user(db, uuid)
     if db_user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
@@ -61,7 +51,7 @@ def update_user(user: schemas.UserUpdate, uuid: str=Depends(auth.verify_token),
     return crud_user.update_user(db, uuid, user)
 
 @router.delete("/user", response_model=schemas.UserResponse)
-def delete_user(uuid: str=Depends(auth.verify_token), db: Session=Depends(get_db), _: str=Depends(auth.verify_token)):
+def delete_user(uuid: str=Depends(auth.verify_token), db: Session=Depends(get_db)):
     db_user=crud_user.get_user(db, uuid)
     if db_user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
@@ -116,6 +106,7 @@ def user_email_confirmation(token: str, db: Session=Depends(get_db)):
         if user.subscription_status == 'inactive':
             user.subscription_status='active'
             db.commit()
+            user_cache.invalidate(user_uuid)
             return HTMLResponse(content=email_template_html, status_code=200)
 
         return HTMLResponse(content="<h1>Error verifying subscription</h1>", status_code=400)
@@ -125,8 +116,8 @@ def user_email_confirmation(token: str, db: Session=Depends(get_db)):
     
 
 @router.post("/users/password_recovery")
-async def password_recovery(request: schemas.RecoveryPassword, db: Session=Depends(get_db)):
-    user=crud_user.get_user_by_email(db, request.email)
+async def password_recovery(request: schemas.RecoveryPassword, db: AsyncSession=Depends(get_async_db)):
+    user=await crud_user.get_user_by_email_async(db, request.email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -144,19 +135,19 @@ async def password_recovery(request: schemas.RecoveryPassword, db: Session=Depen
 
 
 @router.post("/users/reset_password")
-async def reset_password(request: schemas.PasswordResetRequest, db: Session = Depends(get_db)):
+async def reset_password(request: schemas.PasswordResetRequest, db: AsyncSession = Depends(get_async_db)):
     token_data = await get_token_data(request.recovery_token)
 
     if not token_data:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
 
-    user = crud_user.get_user(db, token_data['user_uuid'])
+    user = await crud_user.get_user_async(db, token_data['user_uuid'])
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     validate_password(request.new_password, request.confirm_password)
     user.hashed_password = hash_password(request.new_password)
-    db.commit()
+    await db.commit()
     
     await delete_token(request.recovery_token)
 
@@ -164,9 +155,9 @@ async def reset_password(request: schemas.PasswordResetRequest, db: Session = De
 
 
 @router.delete("/users/exlusion", response_model=schemas.GenericResponse)
-async def user_data_exclusion(payload: schemas.ExclusionRequestCreate, db: Session=Depends(get_db)):
-    user=crud_user.get_user_by_email(db, payload.email)
+async def user_data_exclusion(payload: schemas.ExclusionRequestCreate, db: AsyncSession=Depends(get_async_db)):
+    user=await crud_user.get_user_by_email_async(db, payload.email)
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    crud_user.create_exclusion_request(db, schemas.ExclusionRequestCreate(email=user.email))
+    await crud_user.create_exclusion_request_async(db, user.id, payload.reason)
     return schemas.GenericResponse(message="Exclusion request created", status=True)
\ No newline at end of file
@@ -1,30 +1,97 @@
-import requests
 import json
 import os
+from datetime import datetime, timedelta, timezone
 
-from fastapi import APIRouter, Depends, Query, HTTPException, status
+from fastapi import APIRouter, Depends, Query, HTTPException, Response, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from geoalchemy2.functions import ST_MakeEnvelope
 from geopy.distance import geodesic
-from typing import List
+from typing import List, Optional
 from schemas import schemas
-from database import SessionLocal
-from services import geoloc, auth
+from database import SessionLocal, get_read_db
+from services import geoloc, auth, rollups
 from services.singleton.producer import producer
-from services.singleton.s3 import client_s3
-from crud import crud_user
+from services.singleton.cluster_store import cluster_store
+from services.singleton.cluster_executor import clustering_executor
+from services.singleton.zone_cache import zone_cache
+from services.singleton.zone_single_flight import zone_single_flight
+from services.singleton.tile_store import tile_store
+from services.singleton.tile_publisher import tile_publisher
 
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+CLUSTERING_BACKEND_DESCRIPTION = (
+    "app (default): app engines, each core point only labels its direct neighbours. "
+    "postgis: ST_ClusterDBSCAN, density-connected clusters that grow through chains of core points; "
+    "zones may differ from app for the same filters."
+)
+
+def resolve_clustering_backend(backend: Optional[str]) -> str:
+    backend = (backend or geoloc.CLUSTERING_BACKEND).lower()
+    if backend not in geoloc.CLUSTERING_BACKENDS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid clustering backend")
+    return backend
         
 
+def recent_since(recent_days: Optional[int]) -> Optional[datetime]:
+    if not recent_days:
+        return None
+    # Truncado na hora: o mesmo valor serve ao cache e ao plano por um tempo
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return now - timedelta(days=recent_days)
+
+
+def compute_danger_zones(db: Session, backend: str, lat: float, lng: float, radius: float, occurrenceType: List[str], shifts: List[str], riskLevel: List[str], since: Optional[datetime] = None):
+    if backend == "postgis":
+        return geoloc.PostgisClusteringResult(db).user_location(
+            base_location=[lat, lng],
+            radius_meters=radius,
+            raw_occurrence_type=occurrenceType,
+            raw_shifts=shifts,
+            eps=radius,
+            min_samples=2,
+            risk_level_filter=riskLevel,
+            since=since
+        )
+
+    sc = geoloc.Scans(db).user_location(
+        base_location=[lat, lng],
+        radius_meters=radius,
+        raw_occurrence_type=occurrenceType,
+        raw_shifts=shifts,
+        since=since
+    )
+    cluster = clustering_executor.generate_geojson_cluster_polygons(sc, eps = radius,min_samples=2, risk_level_filter=riskLevel)
+    return len(sc), cluster
+
+
+def compute_remote_zones(db: Session, backend: str, cell_lat: float, cell_lng: float, occurrenceType: List[str], shifts: List[str], riskLevel: List[str]):
+    if backend == "postgis":
+        return geoloc.PostgisClusteringResult(db).remote_scan(
+            bbox=geoloc.cell_bbox(cell_lat, cell_lng, GRID_SIZE),
+            reference_lat=cell_lat + GRID_SIZE / 2,
+            raw_occurrence_type=occurrenceType,
+            raw_shifts=shifts,
+            eps=1,
+            min_samples=2,
+            risk_level_filter=riskLevel
+        )
+
+    if cluster_store.enabled and not occurrenceType and not shifts:
+        return cluster_store.cell_features(db, cell_lat, cell_lng, riskLevel)
+
+    bbox = geoloc.cell_bbox(cell_lat, cell_lng, GRID_SIZE)
+
+    sc = geoloc.Scans(db)
+    points = sc.remote_scan(bbox=bbox, raw_occurrence_type=occurrenceType, raw_shifts=shifts)
+    if len(points) == 0:
+        return 0, []
+
+    geojson = clustering_executor.generate_geojson_cluster_polygons(points, eps=1, min_samples=2, risk_level_filter=riskLevel)
+    return len(points), geojson
+
+
 @router.get("/danger-zones", response_model=schemas.DangerZonesResponse)
 def get_danger_zones(
         lat:float = Query(..., description="Lat"),
@@ -35,31 +102,31 @@ def get_danger_zones(
         riskLevel: List[str] 
         
         = Query(default=[]),
-        db: Session = Depends(get_db),
-        user_uuid: str = Depends(auth.verify_token)
+        clusteringBackend: Optional[str] = Query(default=None, description=CLUSTERING_BACKEND_DESCRIPTION),
+        recentDays: Optional[int] = Query(default=None, ge=1, description="Only occurrences registered in the last N days"),
+        db: Session = Depends(get_read_db),
+        user = Depends(auth.get_current_user)
     ):
-
-    user = crud_user.get_user(db, user_uuid)
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    backend = resolve_clustering_backend(clusteringBackend)
 
     if not user.phone_identifier:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User without token identifier")
 
-    sc = geoloc.Scans(db).user_location(
-        base_location=[lat, lng],
-        radius_meters=radius,
-        raw_occurrence_type=occurrenceType,
-        raw_shifts=shifts,
-    )
-
-    cr = geoloc.ClusteringResult()
-    
     if riskLevel:
         riskLevel = [rsk.lower() for rsk in riskLevel]
-        
-    cluster = cr.generate_geojson_cluster_polygons(sc, eps = radius,min_samples=2, risk_level_filter=riskLevel)
-    if sc:
+
+    cache_key = zone_cache.key(zone_cache.location_key(lat, lng, radius, recentDays), occurrenceType, shifts, riskLevel, radius, 2, backend)
+    result = zone_cache.get(cache_key)
+    if result is None:
+        def compute():
+            point_count, cluster = compute_danger_zones(db, backend, lat, lng, radius, occurrenceType, shifts, riskLevel, recent_since(recentDays))
+            return {"point_count": point_count, "features": cluster}
+
+        # Requisições simultâneas para a mesma chave dividem um único cálculo
+        result, _ = zone_single_flight.run(cache_key, compute)
+    point_count, cluster = result["point_count"], result["features"]
+
+    if point_count:
         producer.send_message(
             {
                 "message":"Warning!",
@@ -76,12 +143,10 @@ def round_grid(value: float, precision=1) -> float:
     return round(value, precision)
 
 
-BUCKET_NAME = 'itssafeboundzones'
-CLOUDFRONT_URL = os.getenv("AWS_CLOUDFRONT_URL")
-GRID_SIZE = 0.1
+GRID_SIZE = geoloc.GRID_SIZE
 
 @router.get("/remote-zones")
-def get_zonas(
+async def get_zonas(
         swLat: float,
         swLng: float,
         neLat: float,
@@ -89,15 +154,10 @@ def get_zonas(
         shifts: List[str] = Query(default=[]),
         occurrenceType: List[str] = Query(default=[]),
         riskLevel: List[str] = Query(default=[]),
-        db: Session = Depends(get_db),
+        clusteringBackend: Optional[str] = Query(default=None, description=CLUSTERING_BACKEND_DESCRIPTION),
+        db: Session = Depends(get_read_db),
     ):
-    bbox = ST_MakeEnvelope(
-        min(swLng, neLng),  
-        min(swLat, neLat),
-        max(swLng, neLng),
-        max(swLat, neLat),
-        4326  # SRID
-    )
+    backend = resolve_clustering_backend(clusteringBackend)
     diagonal_km = geodesic((swLat, swLng), (neLat, neLng)).kilometers
     
     if diagonal_km > 10: 
@@ -108,40 +168,82 @@ def get_zonas(
     cell_lat = round_grid(swLat, 1)
     cell_lng = round_grid(swLng, 1)
 
-    filename = f'zone_{int(cell_lat*100)}_{int(cell_lng*100)}.json'
-    url = f'{CLOUDFRONT_URL}/zones/{filename}'
+    key = f'zones/zone_{int(cell_lat*100)}_{int(cell_lng*100)}.json'
 
-    try:
-        resp = requests.get(url, timeout=3)
-        if resp.status_code == 200:
-            if resp.json():
-                return resp.json()
-    except requests.RequestException:
-        pass 
+    # Tile store sem bloquear o worker; o cálculo (Session síncrona) vai para o threadpool
+    tile = await tile_store.fetch(key)
+    if tile:
+        return Response(content=tile, media_type="application/json")
 
-    bbox = f'SRID=4326;POLYGON(({cell_lng} {cell_lat}, {cell_lng+GRID_SIZE} {cell_lat}, {cell_lng+GRID_SIZE} {cell_lat+GRID_SIZE}, {cell_lng} {cell_lat+GRID_SIZE}, {cell_lng} {cell_lat}))'
+    if riskLevel:
+        riskLevel = [rsk.lower() for rsk in riskLevel]
 
-    sc = geoloc.Scans(db)
-    points = sc.remote_scan(bbox=bbox, raw_occurrence_type=occurrenceType, raw_shifts=shifts)
-        
-    if not points:
+    return await run_in_threadpool(remote_zones_response, db, backend, cell_lat, cell_lng, key, occurrenceType, shifts, riskLevel)
+
+
+def cached_remote_zones(db: Session, backend: str, cell_lat: float, cell_lng: float, cache_key: str, occurrenceType: List[str], shifts: List[str], riskLevel: List[str]):
+    """(resultado, se esta chamada calculou); resultado None se a célula não tem ocorrências."""
+    if not rollups.cell_count(db, cell_lat, cell_lng, occurrenceType, shifts):
+        # Nenhuma ocorrência ativa na célula pelos rollups: nada para agrupar nem publicar
+        return None, False
+
+    def compute():
+        point_count, geojson = compute_remote_zones(db, backend, cell_lat, cell_lng, occurrenceType, shifts, riskLevel)
+        return {"point_count": point_count, "features": geojson}
+
+    # Um cálculo (e um upload) por célula entre as requisições, workers e nós
+    return zone_single_flight.run(cache_key, compute)
+
+
+def remote_zones_response(db: Session, backend: str, cell_lat: float, cell_lng: float, key: str, occurrenceType: List[str], shifts: List[str], riskLevel: List[str]):
+    cache_key = zone_cache.key(zone_cache.cell_key(cell_lat, cell_lng), occurrenceType, shifts, riskLevel, 1, 2, backend)
+    result = zone_cache.get(cache_key)
+    computed = False
+    if result is None:
+        if zone_cache.recently_invalidated(cell_lat, cell_lng):
+            # A réplica pode ainda não ter a escrita que invalidou a célula, e o resultado
+            # ficaria no cache pelo TTL inteiro: recalcula (e recarrega a célula) pelo primário
+            cluster_store.discard(cell_lat, cell_lng)
+            with SessionLocal() as primary:
+                result, computed = cached_remote_zones(primary, backend, cell_lat, cell_lng, cache_key, occurrenceType, shifts, riskLevel)
+        else:
+            result, computed = cached_remote_zones(db, backend, cell_lat, cell_lng, cache_key, occurrenceType, shifts, riskLevel)
+        if result is None:
+            return {"message": "Clean Zone"}
+    point_count, geojson = result["point_count"], result["features"]
+
+    if not point_count:
         return {"message": "Clean Zone"}
 
-    if riskLevel:
-        riskLevel = [rsk.lower() for rsk in riskLevel]
+    if not computed:
+        # Já publicado por quem calculou
+        return geojson
+
+    # Gravação em segundo plano: a resposta não espera o tile store
+    body = json.dumps(geojson)
+    tile_publisher.publish(key, body)
+    tile_store.remember(key, body)
+    return geojson
+
+HEATMAP_MAX_CELLS = int(os.getenv("HEATMAP_MAX_CELLS", 2500))
 
-    clustering = geoloc.ClusteringResult()
-    geojson = clustering.generate_geojson_cluster_polygons(points, eps=1, min_samples=2, risk_level_filter=riskLevel)
-
-    try:
-        bucket_s3 = client_s3.get_client()
-        bucket_s3.put_object(
-            Bucket=BUCKET_NAME,
-            Key=f'zones/{filename}',
-            Body=json.dumps(geojson),
-            ContentType='application/json',
-            CacheControl='public, max-age=604800'
+@router.get("/heatmap", response_model=schemas.HeatmapResponse)
+def get_heatmap(
+        swLat: float,
+        swLng: float,
+        neLat: float,
+        neLng: float,
+        shifts: List[str] = Query(default=[]),
+        occurrenceType: List[str] = Query(default=[]),
+        db: Session = Depends(get_read_db),
+    ):
+    # Lido só de occurrence_cell_rollups: o custo depende das células, não dos pontos
+    bbox = (min(swLng, neLng), min(swLat, neLat), max(swLng, neLng), max(swLat, neLat))
+    columns = rollups.cell_index(bbox[2]) - rollups.cell_index(bbox[0]) + 1
+    rows = rollups.cell_index(bbox[3]) - rollups.cell_index(bbox[1]) + 1
+    if columns * rows > HEATMAP_MAX_CELLS:
+        raise HTTPException(
+            status_code=400,
+            detail="Very wide viewing area. Zoom in on the map to load the heatmap."
         )
-    except Exception as e:
-        print(e)
-    return geojson
\ No newline at end of file
+    return rollups.cells_in_bbox(db, bbox, occurrenceType, shifts)
@@ -1,4 +1,4 @@
-from typing import Optional, List, Union, Literal, Any
+from typing import Optional, List, Union, Literal, Any, Dict
 from pydantic import BaseModel, EmailStr, Field
 from uuid import UUID
 from datetime import datetime
@@ -66,6 +66,28 @@ class OccurrenceResponse(BaseModel):
         from_attributes=True
     
 
+class BulkIngestError(BaseModel):
+    line:int
+    error:str
+
+
+class BulkIngestResponse(BaseModel):
+    inserted:int
+    rejected:int
+    errors:List[BulkIngestError]
+
+
+class HeatmapCell(BaseModel):
+    cell_lat:float
+    cell_lng:float
+    occurrences:int
+    types:Dict[str, int]
+    shifts:Dict[str, int]
+
+
+HeatmapResponse=List[HeatmapCell]
+
+
 class UserOccurrenceCreate(BaseModel):
     user_id:int
     occurrence_id:int
@@ -127,5 +149,5 @@ class GenericResponse(BaseModel):
 
     
 class ExclusionRequestCreate(BaseModel):
-    email:int
+    email:str
     reason:str
\ No newline at end of file
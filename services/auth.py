@@ -1,15 +1,20 @@
 import os
 import jwt
+import secrets
 from dotenv import load_dotenv
 from datetime import timedelta, datetime, timezone
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Header
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.orm import Session
+from database import get_db
+from crud import crud_user
 
 load_dotenv()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 SECRET_KEY = os.getenv("SECRET_SERVER_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
 
 def create_access_token(user:dict, expires_delta: timedelta | None = None) ->str:
     to_encode = user.copy()
@@ -29,4 +34,20 @@ def verify_token(token:str = Depends(oauth2_scheme)) -> str:
             raise HTTPException(status_code=401, detail="Invalid user")
         return user_uuid
     except Exception as e:
-        raise HTTPException(status_code=401, detail="Invalid token: {}".format(e))
\ No newline at end of file
+        raise HTTPException(status_code=401, detail="Invalid token: {}".format(e))
+
+
+def get_current_user(uuid: str = Depends(verify_token), db: Session = Depends(get_db)):
+    # O FastAPI resolve esta dependência uma vez por requisição, mesmo se declarada várias vezes.
+    # Lido do primário: uma réplica atrasada daria 404 logo após o cadastro e poderia
+    # repor no user_cache um phone_identifier já trocado
+    user = crud_user.get_user_cached(db, uuid)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+
+def verify_admin_key(x_admin_key: str = Header(default=None)):
+    # Sem ADMIN_API_KEY configurada as rotas de admin ficam fechadas
+    if not ADMIN_API_KEY or not x_admin_key or not secrets.compare_digest(x_admin_key, ADMIN_API_KEY):
+        raise HTTPException(status_code=403, detail="Invalid admin key")
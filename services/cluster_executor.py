@@ -0,0 +1,80 @@
+import os
+import atexit
+import threading
+import numpy as np
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+
+from services.clustering import ClusteringResult
+from services.singleton.log import logger
+
+
+TAG = "ClusteringExecutor ->"
+
+CLUSTERING_POOL_WORKERS = int(os.getenv("CLUSTERING_POOL_WORKERS", 0))
+CLUSTERING_POOL_MIN_POINTS = int(os.getenv("CLUSTERING_POOL_MIN_POINTS", 20000))
+
+
+def _cluster_job(coords: np.ndarray, eps: float, min_samples: int, risk_level_filter: List[str], engine: str) -> list:
+    # Executado no processo filho: recebe só o array (n, 2) e devolve as features prontas
+    clustering = ClusteringResult(engine)
+    return clustering.generate_geojson_cluster_polygons(coords, eps, min_samples, risk_level_filter)
+
+
+class ClusteringExecutor:
+    """
+    Envia clusterizações grandes para um pool de processos, liberando o worker da API
+    para atender as outras requisições enquanto o DBSCAN roda em outro núcleo.
+    Abaixo de min_points, ou com o pool desativado, a clusterização roda na thread atual.
+    """
+
+    def __init__(
+        self,
+        workers: int = CLUSTERING_POOL_WORKERS,
+        min_points: int = CLUSTERING_POOL_MIN_POINTS
+    ):
+        self.workers = workers
+        self.min_points = min_points
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.lock = threading.Lock()
+        atexit.register(self.shutdown)
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.pool is None:
+                # spawn evita herdar locks das threads do processo da API (ex: RabbitConsumer)
+                self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+                logger.info("{} Started pool with {} workers".format(TAG, self.workers))
+            return self.pool
+
+    def _reset_pool(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = None
+
+    def generate_geojson_cluster_polygons(self, points, eps: float, min_samples: int, risk_level_filter: List[str] = [], engine: Optional[str] = None) -> list:
+        clustering = ClusteringResult(engine)
+        if not self.enabled or len(points) < self.min_points:
+            return clustering.generate_geojson_cluster_polygons(points, eps, min_samples, risk_level_filter)
+
+        coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        try:
+            future = self._get_pool().submit(_cluster_job, coords, eps, min_samples, list(risk_level_filter), clustering.engine)
+            return future.result()
+        except BrokenProcessPool as e:
+            logger.error("{} Pool broken, clustering {} points inline: {}".format(TAG, len(coords), e))
+            self._reset_pool()
+        return clustering.generate_geojson_cluster_polygons(coords, eps, min_samples, risk_level_filter)
+
+    def shutdown(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown(wait=True, cancel_futures=True)
+                self.pool = None
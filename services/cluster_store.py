@@ -0,0 +1,370 @@
+import os
+import math
+import time
+import heapq
+import bisect
+import itertools
+import threading
+import numpy as np
+import shapely
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from scipy.spatial import cKDTree
+from shapely.geometry import MultiPoint
+from sqlalchemy.orm import Session
+
+from services import geoloc
+from services.singleton.log import logger
+
+
+TAG = "ClusterStore ->"
+
+CLUSTER_STORE_ENABLED = os.getenv("CLUSTER_STORE_ENABLED", "true").lower() == "true"
+CLUSTER_STORE_TTL = int(os.getenv("CLUSTER_STORE_TTL", 300))
+CLUSTER_STORE_MAX_CELLS = int(os.getenv("CLUSTER_STORE_MAX_CELLS", 256))
+# Pontos inseridos buscados fora do cKDTree antes de ele ser refeito
+CELL_TREE_MAX_TAIL = int(os.getenv("CELL_TREE_MAX_TAIL", 1024))
+GRID_OFFSETS = tuple(itertools.product((-1, 0, 1), repeat=3))
+
+
+def cell_key(value: float, grid_size: float = geoloc.GRID_SIZE) -> float:
+    return round(math.floor(round(value / grid_size, 9)) * grid_size, 6)
+
+
+class CellClusters:
+    """
+    Clusters de uma célula do grid mantidos em memória, com os mesmos labels de
+    ClusteringResult.dbscan. No laço do dbscan um ponto abre um cluster quando é
+    central e nenhum vizinho de índice menor abriu um antes; os outros pontos ficam
+    no cluster do vizinho de menor índice que abriu um (owner). Quem abre cluster
+    nunca é vizinho de outro que abriu, então há poucos deles em volta de cada ponto
+    e eles ficam num grid próprio (cores_grid).
+
+    Uma inserção só muda a vizinhança do novo ponto. Os pontos que podem passar a
+    abrir um cluster são reavaliados em ordem de índice (heap) e cada mudança só
+    propaga para os vizinhos de índice maior; o resto da célula não é percorrido.
+    Os vizinhos vêm de um cKDTree dos pontos carregados mais uma busca direta nos
+    inseridos depois dele, e a árvore é refeita a cada CELL_TREE_MAX_TAIL inserções.
+    """
+
+    def __init__(self, points, eps: float, min_samples: int):
+        self.clustering = geoloc.ClusteringResult()
+        self.eps = eps
+        self.min_samples = min_samples
+        self.radius = self.clustering.chord_radius(eps)
+        self.loaded_at = time.monotonic()
+        self.lock = threading.Lock()
+
+        coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self.size = coords.shape[0]
+        capacity = max(16, self.size * 2)
+        self.coords = np.empty((capacity, 2), dtype=np.float64)
+        self.xyz = np.empty((capacity, 3), dtype=np.float64)
+        self.owner = np.full(capacity, -1, dtype=np.int64)
+        # Vizinhos de cada ponto (incluindo ele), contados sob demanda; -1 ainda não contado
+        self.counts = np.full(capacity, -1, dtype=np.int64)
+        self.coords[:self.size] = coords
+        self.xyz[:self.size] = self.clustering.unit_vectors(coords)
+        self._build_tree()
+
+        # Pontos que abriram cluster, em ordem de índice (cluster k = cores[k - 1])
+        self.cores = []
+        self.cores_grid = {}
+        self.hulls = {}
+        # Vértices do hull convexo (antes do simplify) de cada cluster com hull
+        self.hull_vertices = {}
+        if self.size and self.eps >= 0:
+            labels = np.full(self.size, -1, dtype=np.int64)
+            self.clustering.label_kdtree(coords, self.xyz[:self.size], self.tree, self.eps, self.min_samples, labels, self.cores)
+            clustered = labels > 0
+            self.owner[:self.size][clustered] = np.asarray(self.cores, dtype=np.int64)[labels[clustered] - 1]
+            for core in self.cores:
+                self._grid_add(core)
+            self._refresh_hulls(set(self.cores))
+
+    @property
+    def labels(self) -> np.ndarray:
+        """Labels de ClusteringResult.dbscan (cluster k = k-ésimo core em ordem de índice)."""
+        owner = self.owner[:self.size]
+        labels = np.full(self.size, -1, dtype=np.int64)
+        clustered = owner >= 0
+        labels[clustered] = np.searchsorted(self.cores, owner[clustered]) + 1
+        return labels
+
+    def _build_tree(self):
+        self.tree_size = self.size
+        self.tree = cKDTree(self.xyz[:self.size].copy()) if self.size else None
+
+    def _append(self, point) -> int:
+        if self.size == self.coords.shape[0]:
+            extra = self.size
+            self.coords = np.concatenate((self.coords, np.empty((extra, 2), dtype=np.float64)))
+            self.xyz = np.concatenate((self.xyz, np.empty((extra, 3), dtype=np.float64)))
+            self.owner = np.concatenate((self.owner, np.full(extra, -1, dtype=np.int64)))
+            self.counts = np.concatenate((self.counts, np.full(extra, -1, dtype=np.int64)))
+
+        index = self.size
+        self.coords[index] = point
+        self.xyz[index] = self.clustering.unit_vectors(self.coords[index:index + 1])[0]
+        self.size += 1
+        if self.size - self.tree_size > CELL_TREE_MAX_TAIL:
+            self._build_tree()
+        return index
+
+    def _within_eps(self, index: int, candidates: np.ndarray) -> np.ndarray:
+        coords = self.coords
+        distances = self.clustering.haversine_many(coords[index, 0], coords[index, 1], coords[candidates, 0], coords[candidates, 1])
+        return candidates[distances <= self.eps]
+
+    def _neighbors(self, index: int) -> np.ndarray:
+        # Mesmo critério do label_kdtree: candidatos pela corda, confirmados pelo haversine
+        candidates = np.empty(0, dtype=np.intp)
+        if self.tree is not None:
+            candidates = np.asarray(self.tree.query_ball_point(self.xyz[index], self.radius), dtype=np.intp)
+        delta = self.xyz[self.tree_size:self.size] - self.xyz[index]
+        tail = np.flatnonzero(np.einsum("ij,ij->i", delta, delta) <= self.radius ** 2) + self.tree_size
+        return self._within_eps(index, np.concatenate((candidates, tail)))
+
+    def _count(self, index: int) -> int:
+        if self.counts[index] < 0:
+            self.counts[index] = len(self._neighbors(index))
+        return int(self.counts[index])
+
+    def _grid_cell(self, index: int) -> Tuple[int, int, int]:
+        return tuple(int(value) for value in np.floor(self.xyz[index] / self.radius))
+
+    def _grid_add(self, core: int):
+        self.cores_grid.setdefault(self._grid_cell(core), set()).add(core)
+
+    def _grid_remove(self, core: int):
+        cell = self._grid_cell(core)
+        self.cores_grid[cell].discard(core)
+        if not self.cores_grid[cell]:
+            del self.cores_grid[cell]
+
+    def _near_cores(self, index: int) -> np.ndarray:
+        """Pontos que abriram cluster a até eps de index (sem ele)."""
+        x, y, z = self._grid_cell(index)
+        found = [
+            core
+            for dx, dy, dz in GRID_OFFSETS
+            for core in self.cores_grid.get((x + dx, y + dy, z + dz), ())
+            if core != index
+        ]
+        if not found:
+            return np.empty(0, dtype=np.intp)
+        return self._within_eps(index, np.asarray(found, dtype=np.intp))
+
+    def _is_core(self, index: int) -> bool:
+        position = bisect.bisect_left(self.cores, index)
+        return position < len(self.cores) and self.cores[position] == index
+
+    def _set_owner(self, index: int, owner: int, previous: dict):
+        previous.setdefault(index, int(self.owner[index]))
+        self.owner[index] = owner
+
+    def _evaluate(self, index: int, heap: list, previous: dict):
+        """Decide de novo se index abre cluster; os cores de índice menor já estão resolvidos."""
+        near = self._near_cores(index)
+        opens = not (near.size and near.min() < index) and self._count(index) >= self.min_samples
+        is_core = self._is_core(index)
+
+        if opens and not is_core:
+            bisect.insort(self.cores, index)
+            self._grid_add(index)
+            self._set_owner(index, index, previous)
+            for neighbor in self._neighbors(index).tolist():
+                owner = self.owner[neighbor]
+                if neighbor == index or (owner != -1 and owner < index):
+                    continue
+                if self._is_core(neighbor):
+                    # Um core de índice maior passa a ser vizinho deste e deixa de abrir cluster
+                    heapq.heappush(heap, neighbor)
+                self._set_owner(neighbor, index, previous)
+        elif not opens:
+            if is_core:
+                del self.cores[bisect.bisect_left(self.cores, index)]
+                self._grid_remove(index)
+                for neighbor in self._neighbors(index).tolist():
+                    if neighbor == index or self.owner[neighbor] != index:
+                        continue
+                    cores = self._near_cores(neighbor)
+                    owner = int(cores.min()) if cores.size else -1
+                    self._set_owner(neighbor, owner, previous)
+                    if neighbor > index and (owner == -1 or owner > neighbor):
+                        heapq.heappush(heap, neighbor)
+            self._set_owner(index, int(near.min()) if near.size else -1, previous)
+
+    def _refresh_hulls(self, cores: set, gained: Dict[int, list] = {}):
+        """
+        Recalcula os hulls dos clusters. Um cluster que só ganhou pontos parte dos vértices
+        do hull anterior (o hull convexo da união é o hull dos vértices mais os novos).
+        """
+        owner = self.owner[:self.size]
+        for core in cores:
+            entry = self.hulls.get(core)
+            added = gained.get(core)
+            if entry is not None and added is not None and core in self.hull_vertices:
+                first_member, occurrence_count, _ = entry
+                first_member = min(first_member, min(added))
+                occurrence_count += len(added)
+                points = np.concatenate((self.hull_vertices[core], self.coords[added]))
+            else:
+                members = np.flatnonzero(owner == core)
+                # O primeiro membro dá a ordem das features, como em batch_cluster_hulls
+                first_member, occurrence_count = int(members[0]), len(members)
+                points = self.coords[members]
+
+            hull = None
+            self.hull_vertices.pop(core, None)
+            if self.clustering.risk_level(occurrence_count) is not None:
+                vertices = shapely.get_coordinates(MultiPoint(points).convex_hull)
+                self.hull_vertices[core] = vertices
+                hull = self.clustering.cluster_hull(vertices)
+            self.hulls[core] = (first_member, occurrence_count, hull)
+
+    def insert(self, point) -> set:
+        """Adiciona um ponto e devolve os ids dos clusters afetados."""
+        index = self._append(point)
+        if self.eps < 0:
+            return set()
+
+        neighbors = self._neighbors(index)
+        self.counts[index] = len(neighbors)
+        others = neighbors[neighbors != index]
+        counted = others[self.counts[others] >= 0]
+        self.counts[counted] += 1
+
+        # Só quem não tem um vizinho de índice menor abrindo cluster pode passar a abrir um
+        owners = self.owner[others]
+        heap = [index] + others[(owners == -1) | (owners > others)].tolist()
+        heapq.heapify(heap)
+        previous = {}
+        evaluated = set()
+        while heap:
+            candidate = heapq.heappop(heap)
+            if candidate not in evaluated:
+                evaluated.add(candidate)
+                self._evaluate(candidate, heap, previous)
+
+        gained, lost = {}, set()
+        for changed, owner in previous.items():
+            current = int(self.owner[changed])
+            if owner == current:
+                continue
+            if owner != -1:
+                lost.add(owner)
+            if current != -1:
+                gained.setdefault(current, []).append(changed)
+
+        touched = lost | set(gained)
+        kept = {core for core in touched if self._is_core(core)}
+        for core in touched - kept:
+            self.hulls.pop(core, None)
+            self.hull_vertices.pop(core, None)
+        self._refresh_hulls(kept, {core: added for core, added in gained.items() if core not in lost})
+        return {bisect.bisect_left(self.cores, core) + 1 for core in kept}
+
+    def features(self, risk_level_filter: List[str] = []) -> list:
+        hulls = [
+            (bisect.bisect_left(self.cores, core) + 1, occurrence_count, hull)
+            for core, (_, occurrence_count, hull) in sorted(self.hulls.items(), key=lambda item: item[1][0])
+            if hull is not None
+        ]
+        return self.clustering.hulls_to_geojson(hulls, risk_level_filter)
+
+
+class IncrementalClusterStore:
+    """
+    Cache por célula do grid dos clusters usados em /remote-zones sem filtros.
+
+    Uma célula é carregada do banco na primeira leitura e, a partir daí, cada
+    ocorrência nova só atualiza os clusters que toca. Células expiram após o TTL
+    para absorver inserções feitas por outros workers.
+    """
+
+    def __init__(
+        self,
+        eps: float = 1,
+        min_samples: int = 2,
+        grid_size: float = geoloc.GRID_SIZE,
+        ttl: int = CLUSTER_STORE_TTL,
+        max_cells: int = CLUSTER_STORE_MAX_CELLS,
+        enabled: bool = CLUSTER_STORE_ENABLED
+    ):
+        self.eps = eps
+        self.min_samples = min_samples
+        self.grid_size = grid_size
+        self.ttl = ttl
+        self.max_cells = max_cells
+        self.enabled = enabled
+        self.cells = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _key(self, cell_lat: float, cell_lng: float) -> Tuple[float, float]:
+        return round(cell_lat, 6), round(cell_lng, 6)
+
+    def _occurrence_key(self, coordinates: list) -> Tuple[float, float]:
+        # coordinates segue o POINT salvo em Occurrence.local: x na posição 0, y na 1
+        return self._key(cell_key(coordinates[1], self.grid_size), cell_key(coordinates[0], self.grid_size))
+
+    def _get_fresh(self, key) -> Optional[CellClusters]:
+        cell = self.cells.get(key)
+        if cell is None:
+            return None
+        if time.monotonic() - cell.loaded_at > self.ttl:
+            del self.cells[key]
+            return None
+        self.cells.move_to_end(key)
+        return cell
+
+    def cell_features(self, db: Session, cell_lat: float, cell_lng: float, risk_level_filter: List[str] = []) -> Tuple[int, list]:
+        """Devolve (quantidade de pontos, features) da célula, carregando-a se preciso."""
+        key = self._key(cell_lat, cell_lng)
+        with self.lock:
+            cell = self._get_fresh(key)
+        if cell is not None:
+            with cell.lock:
+                return cell.size, cell.features(risk_level_filter)
+
+        points = geoloc.Scans(db).remote_scan(bbox=geoloc.cell_bbox(key[0], key[1], self.grid_size))
+        cell = CellClusters(points, self.eps, self.min_samples)
+        logger.info("{} Loaded cell {} with {} points".format(TAG, key, cell.size))
+
+        with self.lock:
+            self.cells[key] = cell
+            self.cells.move_to_end(key)
+            while len(self.cells) > self.max_cells:
+                self.cells.popitem(last=False)
+        with cell.lock:
+            return cell.size, cell.features(risk_level_filter)
+
+    def add_occurrence(self, coordinates: list) -> set:
+        """Aplica uma ocorrência recém-criada à célula carregada que a contém."""
+        if not self.enabled:
+            return set()
+
+        key = self._occurrence_key(coordinates)
+        with self.lock:
+            cell = self._get_fresh(key)
+        if cell is None:
+            return set()
+        # O lock do store só cobre o dicionário de células; a inserção trava só a célula
+        with cell.lock:
+            affected = cell.insert(coordinates)
+
+        logger.info("{} Cell {} updated, affected clusters {}".format(TAG, key, sorted(affected)))
+        return affected
+
+    def discard(self, cell_lat: float, cell_lng: float):
+        with self.lock:
+            self.cells.pop(self._key(cell_lat, cell_lng), None)
+
+    def discard_occurrence(self, coordinates: list):
+        """Descarta a célula que contém a ocorrência; ela volta a ser carregada do banco."""
+        with self.lock:
+            self.cells.pop(self._occurrence_key(coordinates), None)
+
+    def clear(self):
+        with self.lock:
+            self.cells.clear()
@@ -0,0 +1,327 @@
+import os
+import math
+import numpy as np
+from scipy.spatial import cKDTree
+from typing import List, Optional
+
+import shapely
+from shapely import STRtree
+from shapely.geometry import MultiPoint, Polygon
+from shapely.ops import unary_union
+
+
+# DBSCAN e hulls sem dependência de models/database: é o que roda nos processos do
+# ClusteringExecutor, que não devem abrir engines nem threads de health-check
+CLUSTERING_ENGINE = os.getenv("CLUSTERING_ENGINE", "kdtree")
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+RISK_MIN_OCCURRENCES = 10
+
+
+class ClusteringResult:
+    ENGINES = ("kdtree", "numpy", "python")
+
+    def __init__(self, engine: Optional[str] = None):
+        self.engine = engine or CLUSTERING_ENGINE
+        if self.engine not in self.ENGINES:
+            raise ValueError(f"Unknown clustering engine: {self.engine}")
+
+    def haversine(self, lat1, lon1, lat2, lon2):
+        R = 6371  # Raio da Terra em km
+        phi1, phi2 = math.radians(lat1), math.radians(lat2)
+        delta_phi = math.radians(lat2 - lat1)
+        delta_lambda = math.radians(lon2 - lon1)
+
+        a = math.sin(delta_phi / 2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2)**2
+        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+        return R * c 
+
+    def region_query(self, point, points, eps):
+        neighbors = []
+        for i, p in enumerate(points):
+            if self.haversine(point[0], point[1], p[0], p[1]) <= eps:
+                neighbors.append(i)
+        return neighbors
+
+    def haversine_many(self, lat1, lon1, lats2, lons2):
+        # Mesma fórmula de haversine, aplicada de uma vez sobre arrays
+        phi1, phi2 = np.radians(lat1), np.radians(lats2)
+        delta_phi = np.radians(lats2 - lat1)
+        delta_lambda = np.radians(lons2 - lon1)
+
+        a = np.sin(delta_phi / 2)**2 + np.cos(phi1) * np.cos(phi2) * np.sin(delta_lambda / 2)**2
+        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+        return EARTH_RADIUS_KM * c
+
+    def region_query_numpy(self, index: int, coords: np.ndarray, eps: float) -> np.ndarray:
+        distances = self.haversine_many(coords[index, 0], coords[index, 1], coords[:, 0], coords[:, 1])
+        return np.flatnonzero(distances <= eps)
+
+    def unit_vectors(self, coords: np.ndarray) -> np.ndarray:
+        # Projeta [lat, lng] na esfera unitária, onde a distância euclidiana (corda)
+        # cresce junto com a distância de haversine
+        lat, lon = np.radians(coords[:, 0]), np.radians(coords[:, 1])
+        cos_lat = np.cos(lat)
+        return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+    def chord_radius(self, eps: float) -> float:
+        angle = eps / EARTH_RADIUS_KM
+        if angle >= math.pi:
+            return 2.0
+        # Folga para arredondamento; o resultado é refinado com haversine
+        return 2 * math.sin(angle / 2) * (1 + 1e-9) + 1e-12
+
+    def dbscan(self, points: List[List[float]], eps: float, min_samples: int):
+        if self.engine == "kdtree":
+            return self.dbscan_kdtree(points, eps, min_samples)
+        if self.engine == "numpy":
+            return self.dbscan_numpy(points, eps, min_samples)
+        return self.dbscan_python(points, eps, min_samples)
+
+    def dbscan_numpy(self, points, eps: float, min_samples: int):
+        """
+        DBSCAN sobre um array (n, 2) de [lat, lng] com as distâncias calculadas em lote.
+        Gera exatamente os mesmos labels de dbscan_python: um ponto central rotula os
+        vizinhos ainda não visitados e a expansão não é propagada.
+        """
+        coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        n = coords.shape[0]
+        labels = np.full(n, -1, dtype=np.int64)
+        cluster_id = 0
+
+        for i in range(n):
+            if labels[i] != -1:
+                continue
+
+            neighbors = self.region_query_numpy(i, coords, eps)
+            if neighbors.size < min_samples:
+                continue
+
+            cluster_id += 1
+            unvisited = neighbors[labels[neighbors] == -1]
+            labels[unvisited] = cluster_id
+
+        return labels.tolist()
+
+    def dbscan_kdtree(self, points, eps: float, min_samples: int):
+        """
+        Mesmo algoritmo de dbscan_numpy, mas os vizinhos vêm de um cKDTree sobre as
+        coordenadas projetadas; só os candidatos do índice passam pelo haversine.
+        """
+        coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        n = coords.shape[0]
+        labels = np.full(n, -1, dtype=np.int64)
+        if n == 0 or eps < 0:
+            return labels.tolist()
+
+        xyz = self.unit_vectors(coords)
+        self.label_kdtree(coords, xyz, cKDTree(xyz), eps, min_samples, labels, [])
+        return labels.tolist()
+
+    def label_kdtree(self, coords: np.ndarray, xyz: np.ndarray, tree: cKDTree, eps: float, min_samples: int, labels: np.ndarray, cores: list, start: int = 0):
+        """
+        Laço do dbscan_kdtree a partir do ponto start. labels e cores (o ponto central
+        de cada cluster, na ordem dos ids) precisam estar como o laço os deixou ao chegar
+        em start; os dois são atualizados no lugar. O cluster_store usa o start para
+        reprocessar só o fim da ordem depois de uma inserção.
+        """
+        radius = self.chord_radius(eps)
+        cluster_id = len(cores)
+
+        for i in range(start, coords.shape[0]):
+            if labels[i] != -1:
+                continue
+
+            candidates = np.asarray(tree.query_ball_point(xyz[i], radius), dtype=np.intp)
+            distances = self.haversine_many(coords[i, 0], coords[i, 1], coords[candidates, 0], coords[candidates, 1])
+            neighbors = candidates[distances <= eps]
+            if neighbors.size < min_samples:
+                continue
+
+            cluster_id += 1
+            cores.append(i)
+            unvisited = neighbors[labels[neighbors] == -1]
+            labels[unvisited] = cluster_id
+
+    def dbscan_python(self, points: List[List[float]], eps: float, min_samples: int):
+        n = len(points)
+        labels = [-1] * n  # Todos os pontos começam como "não visitados"
+        cluster_id = 0
+
+        for i in range(n):
+            if labels[i] != -1:
+                continue
+
+            neighbors = self.region_query(points[i], points, eps)
+
+            if len(neighbors) < min_samples:
+                labels[i] = -1  # Marca como ruído
+                continue
+
+            cluster_id += 1
+            labels[i] = cluster_id
+
+            to_visit = neighbors[:]
+            to_visit.remove(i)  # Remove o próprio ponto da lista de visitação
+            while to_visit:
+                current_point = to_visit.pop()
+
+                if labels[current_point] == -1:
+                    labels[current_point] = cluster_id 
+                if labels[current_point] != 0:
+                    continue
+
+                new_neighbors = self.region_query(points[current_point], points, eps)
+                if len(new_neighbors) >= min_samples:
+                    to_visit.extend(new_neighbors)
+                    to_visit = list(set(to_visit))  # Elimina duplicatas
+                    labels[current_point] = cluster_id
+
+        return labels
+
+    def is_overlapping(self, new_polygon, clusters_polygons):
+        for existing_polygon in clusters_polygons:
+            if new_polygon.intersects(existing_polygon):  # Verifica se há interseção
+                return True
+        return False
+
+    def simplify_polygon(self, polygon, tolerance=0.01):
+        # Aceita um polígono ou um array de polígonos
+        return shapely.simplify(polygon, tolerance, preserve_topology=True)
+
+    def risk_level(self, occurrence_count: int) -> Optional[str]:
+        if occurrence_count <= RISK_MIN_OCCURRENCES:
+            return None
+        elif occurrence_count > 10 and occurrence_count <=50:
+            return "low"
+        elif occurrence_count > 50 and occurrence_count <=100:
+            return "medium"
+        return "high"
+
+    def batch_cluster_hulls(self, points, labels) -> list:
+        """
+        Agrupa os pontos rotulados com NumPy e gera os hulls simplificados de todos os
+        clusters com risco em chamadas vetorizadas do Shapely. Devolve
+        (cluster_id, occurrence_count, hull) na ordem em que cada cluster aparece.
+        """
+        coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        labels = np.asarray(labels, dtype=np.int64)
+
+        cluster_ids, first_index, counts = np.unique(labels[labels != -1], return_index=True, return_counts=True)
+        keep = np.array([self.risk_level(int(count)) is not None for count in counts], dtype=bool)
+        if not keep.any():
+            return []
+        cluster_ids, counts = cluster_ids[keep], counts[keep]
+
+        # first_index é relativo aos pontos rotulados; a ordem relativa é a mesma
+        appearance = np.argsort(first_index[keep], kind="stable")
+
+        members = np.flatnonzero(np.isin(labels, cluster_ids))
+        members = members[np.argsort(labels[members], kind="stable")]
+        groups = np.searchsorted(cluster_ids, labels[members])
+
+        hulls = shapely.convex_hull(shapely.multipoints(coords[members], indices=groups))
+        is_polygon = shapely.get_type_id(hulls) == shapely.GeometryType.POLYGON
+        hulls[is_polygon] = self.simplify_polygon(hulls[is_polygon])
+
+        return [(int(cluster_ids[i]), int(counts[i]), hulls[i]) for i in appearance]
+
+    def cluster_hull(self, cluster_points):
+        convex_hull = MultiPoint(cluster_points).convex_hull
+        if isinstance(convex_hull, Polygon):
+            return self.simplify_polygon(convex_hull)
+        return convex_hull
+
+    def feature(self, geometry_type: str, coordinates: list, cluster_id: int, risk_level: str, occurrence_count: int) -> dict:
+        return {
+            "type": "Feature",
+            "geometry": {
+                "type": geometry_type,
+                "coordinates": coordinates
+            },
+            "properties": {
+                "cluster_id": cluster_id,
+                "risk_level": risk_level,
+                "occurrence_count": occurrence_count
+            }
+        }
+
+    def earlier_overlaps(self, polygons: list) -> List[List[int]]:
+        """Para cada polígono, os índices dos polígonos anteriores que o intersectam."""
+        earlier = [[] for _ in polygons]
+        if not polygons:
+            return earlier
+
+        tree = STRtree(polygons)
+        current, previous = tree.query(polygons, predicate="intersects")
+        for i, j in zip(current.tolist(), previous.tolist()):
+            if j < i:
+                earlier[i].append(j)
+        return earlier
+
+    def merge_overlapping(self, polygons: list) -> list:
+        """
+        Une cada polígono aos grupos anteriores com que se sobrepõe, na ordem de entrada,
+        e devolve a geometria emitida em cada passo. Os pares sobrepostos vêm de uma só
+        consulta ao STRtree e os grupos são mantidos com union-find.
+        """
+        earlier = self.earlier_overlaps(polygons)
+        parent = list(range(len(polygons)))
+        merged_polygons = {}
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        emitted = []
+        for k, polygon in enumerate(polygons):
+            # As raízes seguem a ordem em que cada grupo foi atualizado pela última vez
+            roots = sorted({find(j) for j in earlier[k]})
+            if roots:
+                merged = unary_union([merged_polygons.pop(root) for root in roots] + [polygon])
+                for root in roots:
+                    parent[root] = k
+                merged_polygons[k] = merged
+                emitted.append(merged)
+            else:
+                merged_polygons[k] = polygon
+                emitted.append(polygon)
+        return emitted
+
+    def hulls_to_geojson(self, hulls, risk_level_filter: List[str] = []):
+        """
+        Monta as features a partir de (cluster_id, occurrence_count, hull), aplicando
+        o filtro de risco e unindo polígonos sobrepostos.
+        """
+        selected = []
+        for cluster_id, occurrence_count, hull in hulls:
+            risk_level = self.risk_level(occurrence_count)
+            if risk_level is None:
+                continue
+
+            if risk_level_filter and risk_level not in risk_level_filter:
+                continue
+
+            selected.append((cluster_id, occurrence_count, risk_level, hull))
+
+        polygons = [hull for _, _, _, hull in selected if isinstance(hull, Polygon)]
+        merged = iter(self.merge_overlapping(polygons))
+
+        geojson = []
+        for cluster_id, occurrence_count, risk_level, hull in selected:
+            if isinstance(hull, Polygon):
+                polygon = next(merged)
+                geojson.append(self.feature("Polygon", list(polygon.exterior.coords), cluster_id, risk_level, occurrence_count))
+            else:
+                # Caso não forme um polígono (ex: apenas dois pontos)
+                geojson.append(self.feature("LineString", list(hull.coords), cluster_id, risk_level, occurrence_count))
+        return geojson
+
+    def generate_geojson_cluster_polygons(self, points: List[List[float]], eps: float, min_samples: int, risk_level_filter: List[str] = []):
+        labels = self.dbscan(points, eps, min_samples)
+        hulls = self.batch_cluster_hulls(points, labels)
+        return self.hulls_to_geojson(hulls, risk_level_filter)
@@ -1,17 +1,20 @@
+import os
 import math
+from datetime import datetime
+import numpy as np
 from typing import List, Optional
 from models import models
 
-from shapely.geometry import MultiPoint
-from shapely.geometry.polygon import Polygon
-from shapely.ops import unary_union
+import shapely
 
 from sqlalchemy.orm import Session
 
-from sqlalchemy import func
-from geoalchemy2 import WKTElement
+from sqlalchemy import func, case, and_
 from geoalchemy2.functions import ST_DWithin
 
+# Reexportados: ClusteringResult e as constantes ficam em services.clustering
+from services.clustering import CLUSTERING_ENGINE, EARTH_RADIUS_KM, KM_PER_DEGREE, RISK_MIN_OCCURRENCES, ClusteringResult
+
 
 
 from shapely.geometry import Polygon
@@ -21,157 +24,43 @@ import math
 from typing import List
 
 
-class ClusteringResult:
-    def __init__(self):
-        return
-
-    def haversine(self, lat1, lon1, lat2, lon2):
-        R = 6371  # Raio da Terra em km
-        phi1, phi2 = math.radians(lat1), math.radians(lat2)
-        delta_phi = math.radians(lat2 - lat1)
-        delta_lambda = math.radians(lon2 - lon1)
-
-        a = math.sin(delta_phi / 2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-
-        return R * c 
-
-    def region_query(self, point, points, eps):
-        neighbors = []
-        for i, p in enumerate(points):
-            if self.haversine(point[0], point[1], p[0], p[1]) <= eps:
-                neighbors.append(i)
-        return neighbors
-
-    def dbscan(self, points: List[List[float]], eps: float, min_samples: int):
-        n = len(points)
-        labels = [-1] * n  # Todos os pontos começam como "não visitados"
-        cluster_id = 0
-
-        for i in range(n):
-            if labels[i] != -1:
-                continue
-
-            neighbors = self.region_query(points[i], points, eps)
-
-            if len(neighbors) < min_samples:
-                labels[i] = -1  # Marca como ruído
-                continue
-
-            cluster_id += 1
-            labels[i] = cluster_id
-
-            to_visit = neighbors[:]
-            to_visit.remove(i)  # Remove o próprio ponto da lista de visitação
-            while to_visit:
-                current_point = to_visit.pop()
-
-                if labels[current_point] == -1:
-                    labels[current_point] = cluster_id 
-                if labels[current_point] != 0:
-                    continue
-
-                new_neighbors = self.region_query(points[current_point], points, eps)
-                if len(new_neighbors) >= min_samples:
-                    to_visit.extend(new_neighbors)
-                    to_visit = list(set(to_visit))  # Elimina duplicatas
-                    labels[current_point] = cluster_id
-
-        return labels
-
-    def is_overlapping(self, new_polygon, clusters_polygons):
-        for existing_polygon in clusters_polygons:
-            if new_polygon.intersects(existing_polygon):  # Verifica se há interseção
-                return True
-        return False
-
-    def simplify_polygon(self, polygon, tolerance=0.01):
-        return polygon.simplify(tolerance, preserve_topology=True)
-
-    def generate_geojson_cluster_polygons(self, points: List[List[float]], eps: float, min_samples: int, risk_level_filter: List[str] = []):
-        labels = self.dbscan(points, eps, min_samples)
-
-        clusters = {}
-        for i, label in enumerate(labels):
-            if label != -1:
-                if label not in clusters:
-                    clusters[label] = []
-                clusters[label].append(points[i])
-
-        geojson = []
-        clusters_polygons = []
-        for cluster_id, cluster_points in clusters.items():
-            multipoint = MultiPoint(cluster_points)
-            convex_hull = multipoint.convex_hull
-            occurrence_count = len(cluster_points)
-
-            if occurrence_count <= 10:
-                continue
-            elif occurrence_count > 10 and occurrence_count <=50:
-                risk_level = "low"
-            elif occurrence_count > 50 and occurrence_count <=100:
-                risk_level = "medium"
-            else:
-                risk_level = "high"
-
-            print(risk_level, risk_level_filter)
-            if risk_level_filter and risk_level not in risk_level_filter:
-                continue
-
-            if isinstance(convex_hull, Polygon):
-                simplified_polygon = self.simplify_polygon(convex_hull)
-
-                overlapping = [p for p in clusters_polygons if p.intersects(simplified_polygon)]
-
-                if overlapping:
-                    overlapping.append(simplified_polygon)
-                    merged = unary_union(overlapping)
-
-                    clusters_polygons = [p for p in clusters_polygons if not any(p.equals(o) for o in overlapping)]
-                    clusters_polygons.append(merged)
-
-                    geojson.append({
-                        "type": "Feature",
-                        "geometry": {
-                            "type": "Polygon",
-                            "coordinates": list(merged.exterior.coords)
-                        },
-                        "properties": {
-                            "cluster_id": cluster_id,
-                            "risk_level": risk_level,
-                            "occurrence_count": occurrence_count
-                        }
-                    })
-                else:
-                    clusters_polygons.append(simplified_polygon)
-                    geojson.append({
-                        "type": "Feature",
-                        "geometry": {
-                            "type": "Polygon",
-                            "coordinates": list(simplified_polygon.exterior.coords)
-                        },
-                        "properties": {
-                            "cluster_id": cluster_id,
-                            "risk_level": risk_level,
-                            "occurrence_count": occurrence_count
-                        }
-                    })
-
-            else:
-                # Caso não forme um polígono (ex: apenas dois pontos)
-                geojson.append({
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "LineString",
-                        "coordinates": list(convex_hull.coords)
-                    },
-                    "properties": {
-                        "cluster_id": cluster_id,
-                        "risk_level": risk_level,
-                        "occurrence_count": occurrence_count
-                    }
-                })
-        return geojson
+CLUSTERING_BACKEND = os.getenv("CLUSTERING_BACKEND", "app")
+# "app" e "postgis" não rotulam igual: ver PostgisClusteringResult
+CLUSTERING_BACKENDS = ("app", "postgis")
+GRID_SIZE = 0.1
+
+
+def cell_bbox(cell_lat: float, cell_lng: float, grid_size: float = GRID_SIZE) -> str:
+    return f'SRID=4326;POLYGON(({cell_lng} {cell_lat}, {cell_lng+grid_size} {cell_lat}, {cell_lng+grid_size} {cell_lat+grid_size}, {cell_lng} {cell_lat+grid_size}, {cell_lng} {cell_lat}))'
+
+
+def apply_occurrence_filters(
+    query,
+    raw_occurrence_types: Optional[List[str]] = None,
+    raw_shifts: Optional[List[str]] = None,
+    since: Optional[datetime] = None
+):
+    """Filtros de tipo, turno e janela de tempo; serve tanto para Query quanto para select()."""
+    # Removidas (soft-delete) já saíram dos rollups: as zonas também não as enxergam
+    query = query.filter(models.Occurrence.deleted_at.is_(None))
+
+    if raw_occurrence_types:
+        valid_types = [ocr.value for ocr in models.Occurrence.OccurrenceType]
+        occurrence_types = [t for t in raw_occurrence_types if t in valid_types]
+        if occurrence_types:
+            query = query.filter(models.Occurrence.type.in_(occurrence_types))
+
+    if raw_shifts:
+        valid_shifts = [shf.value for shf in models.Occurrence.ShiftOptions]
+        shifts = [s for s in raw_shifts if s in valid_shifts]
+        if shifts:
+            query = query.filter(models.Occurrence.shift.in_(shifts))
+
+    if since is not None:
+        # created_at é a chave de partição: o planner descarta os meses anteriores
+        query = query.filter(models.Occurrence.created_at >= since)
+
+    return query
 
 
 
@@ -183,42 +72,111 @@ class Scans():
         self,
         query,
         raw_occurrence_types: Optional[List[str]] = None,
-        raw_shifts: Optional[List[str]] = None
+        raw_shifts: Optional[List[str]] = None,
+        since: Optional[datetime] = None
     ):
-        if raw_occurrence_types:
-            valid_types = [ocr.value for ocr in models.Occurrence.OccurrenceType]
-            occurrence_types = [t for t in raw_occurrence_types if t in valid_types]
-            if occurrence_types:
-                query = query.filter(models.Occurrence.type.in_(occurrence_types))
-
-        if raw_shifts:
-            valid_shifts = [shf.value for shf in models.Occurrence.ShiftOptions]
-            shifts = [s for s in raw_shifts if s in valid_shifts]
-            if shifts:
-                query = query.filter(models.Occurrence.shift.in_(shifts))
-
-        return query
+        return apply_occurrence_filters(query, raw_occurrence_types, raw_shifts, since)
     
-    def user_location(self, base_location: list, radius_meters: float = 1000, raw_occurrence_type: list = [], raw_shifts: list = []):
+    def _user_location_condition(self, base_location: list, radius_meters: float):
         latitude, longitude = base_location
 
-        user_location = WKTElement(f'POINT({longitude} {latitude})', srid=4326)
+        user_location = func.ST_GeogFromText(f'SRID=4326;POINT({longitude} {latitude})')
 
-        query = self.db.query(models.Occurrence).filter(
-            ST_DWithin(
-                func.ST_GeographyFromText(func.ST_AsText(models.Occurrence.local)),
-                user_location,
-                radius_meters
-            )
+        # geography(local) é a mesma expressão do índice idx_occurrences_local_geography
+        return ST_DWithin(
+            func.geography(models.Occurrence.local),
+            user_location,
+            radius_meters
         )
-        
-        query = self._apply_filters(query, raw_occurrence_type, raw_shifts)
-        return [item.coordinates for item in query.all()]
+
+    def _remote_scan_condition(self, bbox: str):
+        return models.Occurrence.local.ST_Within(bbox)
+
+    def _coordinates(self, condition, raw_occurrence_type: list = [], raw_shifts: list = [], since: Optional[datetime] = None) -> np.ndarray:
+        # Busca só x/y do ponto como floats, sem hidratar objetos Occurrence
+        query = self.db.query(
+            func.ST_X(models.Occurrence.local),
+            func.ST_Y(models.Occurrence.local)
+        ).filter(condition)
+
+        query = self._apply_filters(query, raw_occurrence_type, raw_shifts, since)
+        # O DBSCAN depende da ordem dos pontos: a de criação é estável entre leituras e
+        # é a mesma em que o cluster_store acrescenta as ocorrências novas
+        query = query.order_by(models.Occurrence.created_at, models.Occurrence.id)
+        return np.array(query.all(), dtype=np.float64).reshape(-1, 2)
+
+    def user_location(self, base_location: list, radius_meters: float = 1000, raw_occurrence_type: list = [], raw_shifts: list = [], since: Optional[datetime] = None) -> np.ndarray:
+        """Array (n, 2) com as coordenadas das ocorrências no raio, na ordem de Occurrence.coordinates."""
+        return self._coordinates(self._user_location_condition(base_location, radius_meters), raw_occurrence_type, raw_shifts, since)
     
-    def remote_scan(self, bbox:str, raw_occurrence_type:list = [], raw_shifts:list = []) -> list:
-        query = self.db.query(models.Occurrence).filter(
-            models.Occurrence.local.ST_Within(bbox)
+    def remote_scan(self, bbox:str, raw_occurrence_type:list = [], raw_shifts:list = [], since: Optional[datetime] = None) -> np.ndarray:
+        """Array (n, 2) com as coordenadas das ocorrências no bbox, na ordem de Occurrence.coordinates."""
+        return self._coordinates(self._remote_scan_condition(bbox), raw_occurrence_type, raw_shifts, since)
+
+
+class PostgisClusteringResult():
+    """
+    Clusterização feita no próprio PostgreSQL com ST_ClusterDBSCAN. Só os hulls e as
+    contagens de cada cluster voltam do banco; as features são montadas pelo mesmo
+    hulls_to_geojson do ClusteringResult.
+
+    Atenção: ST_ClusterDBSCAN é o DBSCAN padrão, com clusters conectados por densidade
+    (crescem por cadeias de pontos centrais). Os engines do app não propagam a expansão:
+    cada ponto central livre só rotula os vizinhos diretos. Para os mesmos pontos os dois
+    backends podem devolver zonas diferentes (ex: uma avenida vira um cluster único aqui
+    e vários, ou nenhum, no app). Por isso o backend faz parte da chave do zone_cache.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.scans = Scans(db)
+        self.clustering = ClusteringResult()
+
+    def _clusters(self, condition, reference_lat: float, raw_occurrence_type: list, raw_shifts: list, eps: float, min_samples: int, risk_level_filter: List[str], since: Optional[datetime] = None):
+        # Escala os graus para km em torno da latitude de referência, assim o eps do
+        # ST_ClusterDBSCAN fica na mesma unidade do haversine
+        scale_x = KM_PER_DEGREE * math.cos(math.radians(reference_lat))
+        scale_y = KM_PER_DEGREE
+
+        points = self.db.query(
+            models.Occurrence.local.label("local"),
+            func.ST_ClusterDBSCAN(
+                func.ST_Scale(models.Occurrence.local, scale_x, scale_y),
+                eps,
+                min_samples
+            ).over().label("cluster_id")
+        ).filter(condition)
+        points = self.scans._apply_filters(points, raw_occurrence_type, raw_shifts, since).subquery()
+
+        occurrence_count = func.count()
+        hull = func.ST_AsGeoJSON(
+            func.ST_SimplifyPreserveTopology(func.ST_ConvexHull(func.ST_Collect(points.c.local)), 0.01)
+        )
+        rows = (
+            self.db.query(
+                points.c.cluster_id,
+                occurrence_count.label("occurrence_count"),
+                case((and_(points.c.cluster_id.isnot(None), occurrence_count > RISK_MIN_OCCURRENCES), hull)).label("hull")
+            )
+            .group_by(points.c.cluster_id)
+            .order_by(points.c.cluster_id)
+            .all()
         )
 
-        query = self._apply_filters(query, raw_occurrence_type, raw_shifts)
-        return [item.coordinates for item in query.all()]
\ No newline at end of file
+        point_count = sum(row.occurrence_count for row in rows)
+        hulls = [
+            (row.cluster_id + 1, row.occurrence_count, shapely.from_geojson(row.hull))
+            for row in rows
+            if row.hull is not None
+        ]
+        return point_count, self.clustering.hulls_to_geojson(hulls, risk_level_filter)
+
+    def user_location(self, base_location: list, radius_meters: float = 1000, raw_occurrence_type: list = [], raw_shifts: list = [], eps: float = 1, min_samples: int = 2, risk_level_filter: List[str] = [], since: Optional[datetime] = None):
+        """Devolve (quantidade de pontos no raio, features dos clusters)."""
+        condition = self.scans._user_location_condition(base_location, radius_meters)
+        return self._clusters(condition, base_location[0], raw_occurrence_type, raw_shifts, eps, min_samples, risk_level_filter, since)
+
+    def remote_scan(self, bbox: str, reference_lat: float, raw_occurrence_type: list = [], raw_shifts: list = [], eps: float = 1, min_samples: int = 2, risk_level_filter: List[str] = [], since: Optional[datetime] = None):
+        """Devolve (quantidade de pontos no bbox, features dos clusters)."""
+        condition = self.scans._remote_scan_condition(bbox)
+        return self._clusters(condition, reference_lat, raw_occurrence_type, raw_shifts, eps, min_samples, risk_level_filter, since)
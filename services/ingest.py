@@ -0,0 +1,208 @@
+"""
+Carga em lote de ocorrências (bases de parceiros, boletins) direto em occurrences.
+
+Lê JSONL (um OccurrenceCreate por linha) ou CSV (colunas description, type, local_x,
+local_y, event_datetime), valida em blocos, calcula os turnos de forma vetorizada e
+grava cada bloco com COPY. Não passa pela cota mensal nem cria user_occurrences.
+
+Uso (a partir da raiz do repositório):
+    python -m services.ingest ocorrencias.jsonl
+    python -m services.ingest --format csv --chunk-size 100000 boletins.csv
+"""
+import io
+import os
+import csv
+import sys
+import json
+import uuid
+import argparse
+from itertools import islice
+from typing import Iterable, Iterator, List, TextIO, Tuple
+
+from psycopg2.extras import execute_values
+from pydantic import ValidationError
+from sqlalchemy.engine import Engine
+
+from models import models
+from schemas import schemas
+from services import rollups
+from services.utils import determine_shift, determine_shifts
+from services.singleton.log import logger
+
+
+TAG = "OccurrenceIngest ->"
+
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", 50000))
+INGEST_MAX_REPORTED_ERRORS = int(os.getenv("INGEST_MAX_REPORTED_ERRORS", 100))
+INGEST_FORMATS = ("jsonl", "csv")
+CSV_COLUMNS = ("description", "type", "local_x", "local_y", "event_datetime")
+
+COPY_STATEMENT = (
+    "COPY occurrences (uuid, description, type, coordinates, local, shift, event_datetime) "
+    "FROM STDIN WITH (FORMAT csv)"
+)
+
+# O banco guarda o nome do enum (THEFT), a API recebe o valor (Theft)
+TYPE_NAMES = {option.value: option.name for option in models.Occurrence.OccurrenceType}
+SHIFT_NAMES = {option.value: option.name for option in models.Occurrence.ShiftOptions}
+
+
+def read_records(stream: TextIO, fmt: str) -> Iterator[Tuple[int, object]]:
+    """(linha, registro bruto); a conversão e a validação ficam para validate_chunk."""
+    if fmt == "jsonl":
+        for line, text in enumerate(stream, 1):
+            if text.strip():
+                yield line, text
+        return
+
+    reader = csv.DictReader(stream)
+    missing = set(CSV_COLUMNS) - set(reader.fieldnames or [])
+    if missing:
+        raise ValueError("CSV without columns: {}".format(", ".join(sorted(missing))))
+    for row in reader:
+        yield reader.line_num, {
+            "description": row["description"],
+            "type": row["type"],
+            "local": [row["local_x"], row["local_y"]],
+            "event_datetime": row["event_datetime"],
+        }
+
+
+def validate_chunk(records: List[Tuple[int, object]]) -> Tuple[List[Tuple[int, schemas.OccurrenceCreate]], List[dict]]:
+    valid, errors = [], []
+    for line, raw in records:
+        try:
+            data = json.loads(raw) if isinstance(raw, str) else raw
+            occurrence = schemas.OccurrenceCreate.model_validate(data)
+        except (ValueError, ValidationError) as e:
+            errors.append({"line": line, "error": str(e).splitlines()[0]})
+            continue
+
+        if occurrence.type not in TYPE_NAMES:
+            errors.append({"line": line, "error": "Unsupported occurrence type: {}".format(occurrence.type)})
+        elif len(occurrence.local) != 2:
+            errors.append({"line": line, "error": "local must be [x, y]"})
+        else:
+            valid.append((line, occurrence))
+    return valid, errors
+
+
+def chunk_shifts(valid: List[Tuple[int, schemas.OccurrenceCreate]]) -> Tuple[list, List[dict]]:
+    """Turno de cada linha válida (None nas datas inválidas) e os erros dessas linhas."""
+    try:
+        return list(determine_shifts([occurrence.event_datetime for _, occurrence in valid])), []
+    except ValueError:
+        pass
+
+    # Alguma data inválida no bloco: volta para a versão linha a linha só para separar as ruins
+    shifts, errors = [], []
+    for line, occurrence in valid:
+        try:
+            shifts.append(determine_shift(occurrence.event_datetime))
+        except ValueError as e:
+            shifts.append(None)
+            errors.append({"line": line, "error": str(e)})
+    return shifts, errors
+
+
+def copy_buffer(valid: List[Tuple[int, schemas.OccurrenceCreate]], shifts: list) -> Tuple[io.StringIO, list]:
+    """CSV do COPY e as linhas (x, y, tipo, turno) que entraram nele, para os rollups."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+    rows = []
+    for (_, occurrence), shift in zip(valid, shifts):
+        if shift is None:
+            continue
+        x, y = occurrence.local
+        writer.writerow((
+            uuid.uuid4(),
+            occurrence.description,
+            TYPE_NAMES[occurrence.type],
+            json.dumps([x, y]),
+            "SRID=4326;POINT({} {})".format(x, y),
+            SHIFT_NAMES[shift],
+            occurrence.event_datetime,
+        ))
+        rows.append((x, y, occurrence.type, shift))
+    buffer.seek(0)
+    return buffer, rows
+
+
+def copy_chunk(engine: Engine, buffer: io.StringIO, rows: list):
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.copy_expert(COPY_STATEMENT, buffer)
+            # Rollups na mesma transação do COPY
+            execute_values(cursor, rollups.RAW_UPSERT_STATEMENT, rollups.raw_values(rollups.increments(rows)))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def chunks(records: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(records)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def ingest_stream(stream: TextIO, fmt: str = "jsonl", engine: Engine = None, chunk_size: int = INGEST_CHUNK_SIZE) -> dict:
+    """
+    Carrega o stream inteiro, um COPY (e um commit) por bloco: uma falha no meio
+    mantém os blocos anteriores. Devolve os totais e os primeiros erros por linha.
+    """
+    if fmt not in INGEST_FORMATS:
+        raise ValueError("Unsupported format: {}".format(fmt))
+    if engine is None:
+        from database import engine
+
+    inserted, rejected, errors = 0, 0, []
+    for chunk in chunks(read_records(stream, fmt), chunk_size):
+        valid, chunk_errors = validate_chunk(chunk)
+        shifts, shift_errors = chunk_shifts(valid)
+        chunk_errors += shift_errors
+
+        buffer, rows = copy_buffer(valid, shifts)
+        if rows:
+            copy_chunk(engine, buffer, rows)
+
+        inserted += len(rows)
+        rejected += len(chunk_errors)
+        errors.extend(chunk_errors[:max(INGEST_MAX_REPORTED_ERRORS - len(errors), 0)])
+        logger.info("{} Chunk loaded: {} rows inserted, {} rejected ({} inserted so far)".format(TAG, len(rows), len(chunk_errors), inserted))
+
+    if inserted:
+        # As zonas em memória deste processo não enxergam as linhas do COPY
+        from services.singleton.cluster_store import cluster_store
+        from services.singleton.zone_cache import zone_cache
+        cluster_store.clear()
+        zone_cache.clear()
+
+    logger.info("{} Ingest finished: {} inserted, {} rejected".format(TAG, inserted, rejected))
+    return {"inserted": inserted, "rejected": rejected, "errors": errors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga em lote de ocorrências via COPY")
+    parser.add_argument("path", help="arquivo JSONL ou CSV; '-' lê da entrada padrão")
+    parser.add_argument("--format", choices=INGEST_FORMATS, help="padrão: pela extensão do arquivo")
+    parser.add_argument("--chunk-size", type=int, default=INGEST_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "jsonl")
+    if args.path == "-":
+        result = ingest_stream(sys.stdin, fmt, chunk_size=args.chunk_size)
+    else:
+        with open(args.path, "r", encoding="utf-8", newline="") as f:
+            result = ingest_stream(f, fmt, chunk_size=args.chunk_size)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Partições mensais de occurrences (RANGE em created_at, UTC).
+
+ensure_occurrence_partitions cria a partição do mês corrente e as dos próximos
+OCCURRENCE_PARTITIONS_AHEAD meses, além da partição default. É chamada na subida da
+API e por uma thread diária; também pode rodar por cron:
+    python -m services.partitions --months-ahead 6
+"""
+import os
+import time
+import argparse
+import threading
+from datetime import date, datetime, timezone
+from typing import List, Tuple
+
+from sqlalchemy.engine import Engine
+
+from services.singleton.log import logger
+
+
+TAG = "OccurrencePartitions ->"
+
+OCCURRENCE_PARTITIONS_AHEAD = int(os.getenv("OCCURRENCE_PARTITIONS_AHEAD", 3))
+OCCURRENCE_PARTITIONS_INTERVAL = int(os.getenv("OCCURRENCE_PARTITIONS_INTERVAL", 24 * 60 * 60))
+
+IS_PARTITIONED = """
+    SELECT 1 FROM pg_partitioned_table p
+    JOIN pg_class c ON c.oid = p.partrelid
+    WHERE c.relname = 'occurrences' AND c.relnamespace = 'public'::regnamespace
+"""
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_partitions(first_month: date, count: int) -> List[Tuple[str, date, date]]:
+    """(nome, início, fim) de count partições mensais a partir de first_month."""
+    partitions = []
+    for i in range(count):
+        start = add_months(first_month, i)
+        partitions.append(("occurrences_{:%Y_%m}".format(start), start, add_months(start, 1)))
+    return partitions
+
+
+def partition_ddl(name: str, start: date, end: date) -> str:
+    return (
+        "CREATE TABLE IF NOT EXISTS {} PARTITION OF occurrences "
+        "FOR VALUES FROM ('{} 00:00:00+00') TO ('{} 00:00:00+00')"
+    ).format(name, start.isoformat(), end.isoformat())
+
+
+def ensure_occurrence_partitions(engine: Engine, months_ahead: int = OCCURRENCE_PARTITIONS_AHEAD) -> int:
+    """Cria as partições que faltam; devolve quantas foram verificadas. Idempotente."""
+    with engine.connect() as conn:
+        if conn.exec_driver_sql(IS_PARTITIONED).first() is None:
+            logger.info("{} occurrences is not partitioned, skipping".format(TAG))
+            return 0
+
+    now = datetime.now(timezone.utc)
+    partitions = month_partitions(date(now.year, now.month, 1), months_ahead + 1)
+    for name, start, end in partitions:
+        try:
+            # Uma transação por partição: uma falha (ex: linhas do mês já na default) não trava as outras
+            with engine.begin() as conn:
+                conn.exec_driver_sql(partition_ddl(name, start, end))
+        except Exception as e:
+            logger.error("{} Could not create partition {}: {}".format(TAG, name, e))
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS occurrences_default PARTITION OF occurrences DEFAULT")
+
+    logger.info("{} Partitions ensured up to {}".format(TAG, partitions[-1][0]))
+    return len(partitions)
+
+
+def start_partition_maintenance(engine: Engine, interval: int = OCCURRENCE_PARTITIONS_INTERVAL) -> threading.Thread:
+    def loop():
+        while True:
+            try:
+                ensure_occurrence_partitions(engine)
+            except Exception as e:
+                logger.error("{} Partition maintenance failed: {}".format(TAG, e))
+            time.sleep(interval)
+
+    thread = threading.Thread(target=loop, daemon=True, name="OccurrencePartitions")
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cria as partições mensais futuras de occurrences")
+    parser.add_argument("--months-ahead", type=int, default=OCCURRENCE_PARTITIONS_AHEAD)
+    args = parser.parse_args()
+
+    from database import engine
+    ensure_occurrence_partitions(engine, args.months_ahead)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,15 @@
 
+import os
 import redis.asyncio as redis
 import json
+from redis import Redis
 from datetime import timedelta
 
-r = redis.from_url("redis://localhost", decode_responses=True)
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost")
+
+r = redis.from_url(REDIS_URL, decode_responses=True)
+# Cliente síncrono para as rotas que rodam no threadpool (ex: zones)
+r_sync = Redis.from_url(REDIS_URL, decode_responses=True, socket_connect_timeout=0.5, socket_timeout=0.5)
 
 
 TOKEN_PREFIX = "pwd-recovery:"
@@ -0,0 +1,149 @@
+"""
+Contagens por célula do grid (geoloc.GRID_SIZE), tipo e turno em occurrence_cell_rollups.
+
+Mantidas na mesma transação das escritas em occurrences (criação, carga em lote e
+soft-delete), servem as checagens de zona limpa e o heatmap sem ler os pontos.
+Para recalcular tudo a partir de occurrences:
+    python -m services.rollups --rebuild
+"""
+import math
+import argparse
+from collections import Counter
+from typing import Iterable, List, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from models import models
+from services import geoloc
+from services.singleton.log import logger
+
+
+TAG = "CellRollups ->"
+
+ROLLUP = models.OccurrenceCellRollup
+
+# Mesmo cálculo de cell_index, em SQL, para o rebuild
+REBUILD_STATEMENTS = (
+    "DELETE FROM occurrence_cell_rollups",
+    """
+    INSERT INTO occurrence_cell_rollups (cell_x, cell_y, type, shift, occurrences)
+    SELECT floor(round((ST_X(local) / {grid})::numeric, 9))::int,
+           floor(round((ST_Y(local) / {grid})::numeric, 9))::int,
+           type, shift, count(*)
+    FROM occurrences
+    WHERE deleted_at IS NULL AND local IS NOT NULL
+    GROUP BY 1, 2, 3, 4
+    """.format(grid=geoloc.GRID_SIZE),
+)
+
+# Para conexões DBAPI (COPY da carga em lote), com execute_values do psycopg2
+RAW_UPSERT_STATEMENT = """
+    INSERT INTO occurrence_cell_rollups (cell_x, cell_y, type, shift, occurrences) VALUES %s
+    ON CONFLICT (cell_x, cell_y, type, shift)
+    DO UPDATE SET occurrences = occurrence_cell_rollups.occurrences + EXCLUDED.occurrences, updated_at = now()
+"""
+
+
+def cell_index(value: float, grid_size: float = geoloc.GRID_SIZE) -> int:
+    # Arredonda antes do floor para -23.6 / 0.1 cair na célula -236 e não na -237
+    return math.floor(round(value / grid_size, 9))
+
+
+def increments(rows: Iterable[Tuple[float, float, str, str]], delta: int = 1) -> List[dict]:
+    """Agrupa (x, y, tipo, turno) por célula; tipo e turno podem ser o enum ou o seu valor."""
+    counts = Counter(
+        (cell_index(x), cell_index(y), models.Occurrence.OccurrenceType(occurrence_type), models.Occurrence.ShiftOptions(shift))
+        for x, y, occurrence_type, shift in rows
+    )
+    return [
+        {"cell_x": cell_x, "cell_y": cell_y, "type": occurrence_type, "shift": shift, "occurrences": count * delta}
+        for (cell_x, cell_y, occurrence_type, shift), count in counts.items()
+    ]
+
+
+def upsert_statement():
+    statement = insert(ROLLUP)
+    return statement.on_conflict_do_update(
+        index_elements=[ROLLUP.cell_x, ROLLUP.cell_y, ROLLUP.type, ROLLUP.shift],
+        set_={"occurrences": ROLLUP.occurrences + statement.excluded.occurrences, "updated_at": func.now()}
+    )
+
+
+def raw_values(rows: List[dict]) -> List[tuple]:
+    return [(row["cell_x"], row["cell_y"], row["type"].name, row["shift"].name, row["occurrences"]) for row in rows]
+
+
+def _filtered(statement, raw_occurrence_types: List[str], raw_shifts: List[str]):
+    valid_types = [ocr.value for ocr in models.Occurrence.OccurrenceType]
+    occurrence_types = [t for t in raw_occurrence_types or [] if t in valid_types]
+    if occurrence_types:
+        statement = statement.where(ROLLUP.type.in_(occurrence_types))
+
+    valid_shifts = [shf.value for shf in models.Occurrence.ShiftOptions]
+    shifts = [s for s in raw_shifts or [] if s in valid_shifts]
+    if shifts:
+        statement = statement.where(ROLLUP.shift.in_(shifts))
+    return statement
+
+
+def cell_count(db: Session, cell_lat: float, cell_lng: float, raw_occurrence_types: List[str] = [], raw_shifts: List[str] = []) -> int:
+    """Ocorrências ativas na célula de /remote-zones (canto sudoeste em cell_lat, cell_lng)."""
+    statement = select(func.coalesce(func.sum(ROLLUP.occurrences), 0)).where(
+        ROLLUP.cell_x == cell_index(cell_lng),
+        ROLLUP.cell_y == cell_index(cell_lat)
+    )
+    return db.scalar(_filtered(statement, raw_occurrence_types, raw_shifts))
+
+
+def cells_in_bbox(db: Session, bbox: Tuple[float, float, float, float], raw_occurrence_types: List[str] = [], raw_shifts: List[str] = []) -> List[dict]:
+    """Células com ocorrências dentro de bbox (min_x, min_y, max_x, max_y), com a quebra por tipo e turno."""
+    min_x, min_y, max_x, max_y = bbox
+    statement = select(ROLLUP.cell_x, ROLLUP.cell_y, ROLLUP.type, ROLLUP.shift, ROLLUP.occurrences).where(
+        ROLLUP.cell_x.between(cell_index(min_x), cell_index(max_x)),
+        ROLLUP.cell_y.between(cell_index(min_y), cell_index(max_y)),
+        ROLLUP.occurrences > 0
+    )
+
+    cells = {}
+    for row in db.execute(_filtered(statement, raw_occurrence_types, raw_shifts)):
+        cell = cells.get((row.cell_x, row.cell_y))
+        if cell is None:
+            cell = cells[(row.cell_x, row.cell_y)] = {
+                "cell_lat": round(row.cell_y * geoloc.GRID_SIZE, 6),
+                "cell_lng": round(row.cell_x * geoloc.GRID_SIZE, 6),
+                "occurrences": 0,
+                "types": {},
+                "shifts": {},
+            }
+        cell["occurrences"] += row.occurrences
+        cell["types"][row.type.value] = cell["types"].get(row.type.value, 0) + row.occurrences
+        cell["shifts"][row.shift.value] = cell["shifts"].get(row.shift.value, 0) + row.occurrences
+    return list(cells.values())
+
+
+def rebuild(engine: Engine):
+    with engine.begin() as conn:
+        for statement in REBUILD_STATEMENTS:
+            conn.exec_driver_sql(statement)
+        cells = conn.exec_driver_sql("SELECT count(*) FROM occurrence_cell_rollups").scalar()
+    logger.info("{} Rebuilt {} rollup rows".format(TAG, cells))
+    return cells
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rollups de ocorrências por célula do grid")
+    parser.add_argument("--rebuild", action="store_true", help="recalcula a tabela inteira a partir de occurrences")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        from database import engine
+        print("{} rollup rows".format(rebuild(engine)))
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
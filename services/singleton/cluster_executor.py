@@ -0,0 +1,3 @@
+from services.cluster_executor import ClusteringExecutor
+
+clustering_executor = ClusteringExecutor()
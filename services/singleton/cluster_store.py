@@ -0,0 +1,3 @@
+from services.cluster_store import IncrementalClusterStore
+
+cluster_store = IncrementalClusterStore()
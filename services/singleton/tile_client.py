@@ -0,0 +1,3 @@
+from services.tile_client import ZoneTileClient
+
+tile_client = ZoneTileClient()
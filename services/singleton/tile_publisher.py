@@ -0,0 +1,4 @@
+from services.tile_publisher import ZoneTilePublisher
+from services.singleton.tile_store import tile_store
+
+tile_publisher = ZoneTilePublisher(tile_store)
@@ -0,0 +1,3 @@
+from services.tile_store import build_tile_store
+
+tile_store = build_tile_store()
@@ -0,0 +1,3 @@
+from services.user_cache import UserProfileCache
+
+user_cache = UserProfileCache()
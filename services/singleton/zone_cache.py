@@ -0,0 +1,3 @@
+from services.zone_cache import ZoneResultCache
+
+zone_cache = ZoneResultCache()
@@ -0,0 +1,4 @@
+from services.zone_single_flight import ZoneSingleFlight
+from services.singleton.zone_cache import zone_cache
+
+zone_single_flight = ZoneSingleFlight(zone_cache)
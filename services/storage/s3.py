@@ -13,6 +13,9 @@ class AmazonS3Client:
         self.client=None
 
     def get_client(self):
+        # Clients do boto3 são thread-safe: um por processo, reaproveitando as conexões
+        if self.client is not None:
+            return self.client
         self.client = boto3.client(
             self.service,
             aws_access_key_id=self.aws_access_key_id,
@@ -0,0 +1,106 @@
+import os
+import threading
+from cachetools import TTLCache
+from typing import Optional, Union
+
+import httpx
+
+from services.singleton.log import logger
+from services.tile_store import tile_is_empty
+
+
+TAG = "ZoneTileClient ->"
+
+CLOUDFRONT_URL = os.getenv("AWS_CLOUDFRONT_URL")
+ZONE_TILE_CONNECT_TIMEOUT = float(os.getenv("ZONE_TILE_CONNECT_TIMEOUT", 0.3))
+ZONE_TILE_READ_TIMEOUT = float(os.getenv("ZONE_TILE_READ_TIMEOUT", 0.8))
+ZONE_TILE_MAX_CONNECTIONS = int(os.getenv("ZONE_TILE_MAX_CONNECTIONS", 50))
+ZONE_TILE_KEEPALIVE = int(os.getenv("ZONE_TILE_KEEPALIVE", 20))
+ZONE_TILE_CACHE_TTL = int(os.getenv("ZONE_TILE_CACHE_TTL", 60))
+ZONE_TILE_MISS_TTL = int(os.getenv("ZONE_TILE_MISS_TTL", 15))
+ZONE_TILE_CACHE_MAX_ENTRIES = int(os.getenv("ZONE_TILE_CACHE_MAX_ENTRIES", 2048))
+
+
+class ZoneTileClient:
+    """
+    Leitura dos tiles de zonas publicados no CloudFront (zones/<arquivo>.json) por um
+    httpx.AsyncClient compartilhado, com keep-alive e timeouts curtos: se o CDN demorar,
+    a rota cai para o banco em vez de segurar a requisição. Guarda em memória os tiles
+    encontrados e, por menos tempo, os que não existem, para uma célula quente custar
+    uma ida ao CDN por TTL.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = CLOUDFRONT_URL,
+        cache_ttl: int = ZONE_TILE_CACHE_TTL,
+        miss_ttl: int = ZONE_TILE_MISS_TTL,
+        max_entries: int = ZONE_TILE_CACHE_MAX_ENTRIES
+    ):
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.tiles = TTLCache(maxsize=max_entries, ttl=cache_ttl)
+        self.misses = TTLCache(maxsize=max_entries, ttl=miss_ttl)
+        self.lock = threading.Lock()
+        self.client: Optional[httpx.AsyncClient] = None
+
+    def _client(self) -> httpx.AsyncClient:
+        # Criado no primeiro uso, dentro do event loop que vai usá-lo
+        if self.client is None or self.client.is_closed:
+            self.client = httpx.AsyncClient(
+                timeout=httpx.Timeout(ZONE_TILE_READ_TIMEOUT, connect=ZONE_TILE_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=ZONE_TILE_MAX_CONNECTIONS,
+                    max_keepalive_connections=ZONE_TILE_KEEPALIVE
+                )
+            )
+        return self.client
+
+    def remember(self, key: str, body: Union[str, bytes]):
+        """Tile recém-publicado por este processo: serve daqui e esquece o miss anterior."""
+        with self.lock:
+            self.tiles[key] = body.encode() if isinstance(body, str) else body
+            self.misses.pop(key, None)
+
+    def forget(self, key: str):
+        with self.lock:
+            self.tiles.pop(key, None)
+
+    async def fetch(self, key: str) -> Optional[bytes]:
+        """JSON do tile, ou None se ele não existir, estiver vazio ou o CDN falhar."""
+        if self.base_url is None:
+            return None
+
+        with self.lock:
+            body = self.tiles.get(key)
+            if body is not None:
+                return body
+            if key in self.misses:
+                return None
+
+        try:
+            resp = await self._client().get("{}/{}".format(self.base_url, key))
+        except httpx.HTTPError as e:
+            # Falha de rede não vira miss: a próxima requisição tenta de novo
+            logger.error("{} CloudFront lookup failed for {}: {}".format(TAG, key, repr(e)))
+            return None
+
+        body = None
+        if resp.status_code == 200:
+            try:
+                # Valida uma vez por TTL; dali em diante os bytes saem como vieram
+                resp.json()
+                body = resp.content
+            except ValueError:
+                logger.error("{} Invalid tile body for {}".format(TAG, key))
+
+        with self.lock:
+            if not tile_is_empty(body):
+                self.tiles[key] = body
+                return body
+            self.misses[key] = True
+        return None
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
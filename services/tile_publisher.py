@@ -0,0 +1,135 @@
+import os
+import time
+import queue
+import threading
+from typing import Dict, List, Optional
+
+from services.singleton.log import logger
+from services.tile_store import Body, TileStore
+
+
+TAG = "ZoneTilePublisher ->"
+
+TILE_PUBLISHER_WORKERS = int(os.getenv("TILE_PUBLISHER_WORKERS", 2))
+TILE_PUBLISHER_QUEUE_SIZE = int(os.getenv("TILE_PUBLISHER_QUEUE_SIZE", 1000))
+TILE_PUBLISHER_BATCH_SIZE = int(os.getenv("TILE_PUBLISHER_BATCH_SIZE", 20))
+TILE_PUBLISHER_MAX_RETRIES = int(os.getenv("TILE_PUBLISHER_MAX_RETRIES", 3))
+TILE_PUBLISHER_RETRY_BACKOFF = float(os.getenv("TILE_PUBLISHER_RETRY_BACKOFF", 0.5))
+TILE_PUBLISHER_SHUTDOWN_TIMEOUT = float(os.getenv("TILE_PUBLISHER_SHUTDOWN_TIMEOUT", 10))
+
+
+class ZoneTilePublisher:
+    """
+    Publicação dos tiles de zonas fora da requisição (write-behind): publish só enfileira
+    e a rota responde assim que a clusterização termina. Uma fila limitada alimenta
+    `workers` threads que retiram até batch_size chaves por vez e gravam com retry e
+    backoff exponencial. Chaves repetidas ainda na fila são fundidas e sobe só o corpo
+    mais recente. Com a fila cheia o tile é descartado: a próxima requisição da célula
+    o calcula de novo.
+    """
+
+    def __init__(
+        self,
+        store: TileStore,
+        workers: int = TILE_PUBLISHER_WORKERS,
+        max_queue: int = TILE_PUBLISHER_QUEUE_SIZE,
+        batch_size: int = TILE_PUBLISHER_BATCH_SIZE,
+        max_retries: int = TILE_PUBLISHER_MAX_RETRIES,
+        retry_backoff: float = TILE_PUBLISHER_RETRY_BACKOFF
+    ):
+        self.store = store
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.pending: Dict[str, Body] = {}
+        self.lock = threading.Lock()
+        self.threads: List[threading.Thread] = []
+        self.counters = {"published": 0, "failed": 0, "dropped": 0, "coalesced": 0, "retries": 0}
+
+    def _start(self):
+        # Threads criadas no primeiro publish, não no import
+        if self.threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, daemon=True, name="ZoneTilePublisher-{}".format(i))
+            thread.start()
+            self.threads.append(thread)
+
+    def _count(self, counter: str, amount: int = 1):
+        with self.lock:
+            self.counters[counter] += amount
+
+    def publish(self, key: str, body: Body) -> bool:
+        """Enfileira o tile; False se ele foi descartado por falta de espaço na fila."""
+        with self.lock:
+            self._start()
+            if key in self.pending:
+                self.pending[key] = body
+                self.counters["coalesced"] += 1
+                return True
+            try:
+                self.queue.put_nowait(key)
+            except queue.Full:
+                self.counters["dropped"] += 1
+                logger.error("{} Queue full, dropping tile {}".format(TAG, key))
+                return False
+            self.pending[key] = body
+            return True
+
+    def _batch(self) -> List[str]:
+        keys = [self.queue.get()]
+        while len(keys) < self.batch_size:
+            try:
+                keys.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return keys
+
+    def _write(self, key: str, body: Body) -> bool:
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.store.put(key, body)
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error("{} Could not publish {} after {} attempts: {}".format(TAG, key, attempt + 1, e))
+                    return False
+                self._count("retries")
+                time.sleep(self.retry_backoff * 2 ** attempt)
+
+    def _run(self):
+        while True:
+            keys = self._batch()
+            published = 0
+            for key in keys:
+                with self.lock:
+                    body = self.pending.pop(key, None)
+                try:
+                    if body is not None and self._write(key, body):
+                        published += 1
+                    elif body is not None:
+                        self._count("failed")
+                finally:
+                    self.queue.task_done()
+            self._count("published", published)
+            logger.info("{} Published {}/{} tiles".format(TAG, published, len(keys)))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Espera a fila esvaziar; True se tudo foi processado dentro do timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout: float = TILE_PUBLISHER_SHUTDOWN_TIMEOUT):
+        # Workers são daemon: o que não subir até o timeout se perde com o processo
+        if not self.flush(timeout):
+            logger.error("{} Shutdown with {} tiles still queued".format(TAG, self.queue.unfinished_tasks))
+
+    def stats(self) -> dict:
+        with self.lock:
+            return dict(self.counters, queued=self.queue.qsize(), workers=len(self.threads))
@@ -0,0 +1,194 @@
+import os
+import abc
+import mmap
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Optional, Union
+
+from services.singleton.log import logger
+
+
+TAG = "ZoneTileStore ->"
+
+# Configuração anterior ao ZONE_TILE_STORE: publicar os tiles num diretório local.
+# Continua valendo como atalho para ZONE_TILE_STORE=local com ZONE_TILE_LOCAL_DIR
+ZONE_TILE_PUBLISH_DIR = os.getenv("ZONE_TILE_PUBLISH_DIR")
+ZONE_TILE_STORE = os.getenv("ZONE_TILE_STORE", "local" if ZONE_TILE_PUBLISH_DIR else "s3").lower()
+ZONE_TILE_BUCKET = os.getenv("ZONE_TILE_BUCKET", "itssafeboundzones")
+ZONE_TILE_CACHE_CONTROL = os.getenv("ZONE_TILE_CACHE_CONTROL", "public, max-age=604800")
+ZONE_TILE_LOCAL_DIR = os.getenv("ZONE_TILE_LOCAL_DIR", ZONE_TILE_PUBLISH_DIR or "tiles")
+ZONE_TILE_MMAP_MAX_OPEN = int(os.getenv("ZONE_TILE_MMAP_MAX_OPEN", 256))
+# Mesma validade do Cache-Control dos tiles no S3; 0 não expira
+ZONE_TILE_LOCAL_MAX_AGE = int(os.getenv("ZONE_TILE_LOCAL_MAX_AGE", 604800))
+ZONE_TILE_STORES = ("s3", "local", "mirror")
+
+Body = Union[str, bytes]
+# O LocalTileStore devolve uma memoryview do mmap, sem copiar o arquivo
+Tile = Union[bytes, memoryview]
+EMPTY_TILE_MAX_SIZE = 16
+
+
+def tile_is_empty(body: Optional[Tile]) -> bool:
+    # Tiles vazios ("[]", "{}") contam como ausentes, como no lookup antigo do CloudFront
+    if not body:
+        return True
+    if len(body) > EMPTY_TILE_MAX_SIZE:
+        return False
+    return bytes(body).strip() in (b"[]", b"{}", b"null")
+
+
+class TileStore(abc.ABC):
+    """
+    Onde os tiles de zonas (zones/zone_<lat>_<lng>.json) são lidos e gravados.
+    fetch devolve o JSON já serializado, para a rota responder sem decodificar;
+    put grava de forma síncrona e é chamado pelos workers do ZoneTilePublisher.
+    """
+
+    @abc.abstractmethod
+    async def fetch(self, key: str) -> Optional[Tile]:
+        pass
+
+    @abc.abstractmethod
+    def put(self, key: str, body: Body):
+        pass
+
+    def remember(self, key: str, body: Body):
+        """Tile calculado por este processo e ainda na fila do publisher."""
+
+
+class S3TileStore(TileStore):
+    """Leitura pelo CloudFront (ZoneTileClient) e gravação no bucket com o client reaproveitado."""
+
+    def __init__(self, tile_client=None, s3_client=None, bucket: str = ZONE_TILE_BUCKET, cache_control: str = ZONE_TILE_CACHE_CONTROL):
+        if tile_client is None:
+            from services.singleton.tile_client import tile_client
+        if s3_client is None:
+            from services.singleton.s3 import client_s3 as s3_client
+        self.tile_client = tile_client
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.cache_control = cache_control
+
+    async def fetch(self, key: str) -> Optional[Tile]:
+        return await self.tile_client.fetch(key)
+
+    def put(self, key: str, body: Body):
+        self.s3_client.get_client().put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=body,
+            ContentType='application/json',
+            CacheControl=self.cache_control
+        )
+
+    def remember(self, key: str, body: Body):
+        self.tile_client.remember(key, body)
+
+
+class LocalTileStore(TileStore):
+    """
+    Diretório local de tiles (espelho no nó, dev e testes sem AWS). As leituras usam
+    mmap: os arquivos mais lidos ficam mapeados, validados por um stat a cada fetch,
+    e a resposta recebe uma memoryview do mapeamento, sem cópia. put troca o arquivo
+    por os.replace, então um mapeamento antigo continua válido enquanto houver views.
+    O stat e o mmap rodam numa thread (asyncio.to_thread), fora do event loop.
+    """
+
+    def __init__(self, root: str = ZONE_TILE_LOCAL_DIR, max_open: int = ZONE_TILE_MMAP_MAX_OPEN, max_age: int = ZONE_TILE_LOCAL_MAX_AGE):
+        self.root = root
+        self.max_age = max_age
+        self.max_open = max_open
+        self.maps = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        parts = [part for part in key.split("/") if part not in ("", ".", "..")]
+        return os.path.join(self.root, *parts)
+
+    def _evict(self, path: str):
+        entry = self.maps.pop(path, None)
+        if entry is None:
+            return
+        try:
+            entry[1].close()
+        except BufferError:
+            # Ainda há uma resposta lendo a view: o mapeamento é desfeito quando ela for liberada
+            pass
+
+    def read(self, key: str) -> Optional[memoryview]:
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            with self.lock:
+                self._evict(path)
+            return None
+        if not stat.st_size or (self.max_age and time.time() - stat.st_mtime > self.max_age):
+            return None
+
+        version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            entry = self.maps.get(path)
+            if entry is not None and entry[0] == version:
+                self.maps.move_to_end(path)
+                return memoryview(entry[1])
+            self._evict(path)
+
+            with open(path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.maps[path] = (version, mapped)
+            while len(self.maps) > self.max_open:
+                self._evict(next(iter(self.maps)))
+            return memoryview(mapped)
+
+    async def fetch(self, key: str) -> Optional[Tile]:
+        body = await asyncio.to_thread(self.read, key)
+        return None if tile_is_empty(body) else body
+
+    def put(self, key: str, body: Body):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = "{}.{}.tmp".format(path, threading.get_ident())
+        with open(tmp, "wb") as f:
+            f.write(body.encode() if isinstance(body, str) else body)
+        os.replace(tmp, path)
+
+
+class MirroredTileStore(TileStore):
+    """Espelho local na frente de outro store: lê do disco primeiro e copia os acertos remotos."""
+
+    def __init__(self, local: LocalTileStore, remote: TileStore):
+        self.local = local
+        self.remote = remote
+
+    async def fetch(self, key: str) -> Optional[Tile]:
+        body = await self.local.fetch(key)
+        if body is not None:
+            return body
+
+        body = await self.remote.fetch(key)
+        if body is not None:
+            try:
+                await asyncio.to_thread(self.local.put, key, body)
+            except OSError as e:
+                logger.error("{} Could not mirror {}: {}".format(TAG, key, e))
+        return body
+
+    def put(self, key: str, body: Body):
+        self.local.put(key, body)
+        self.remote.put(key, body)
+
+    def remember(self, key: str, body: Body):
+        self.remote.remember(key, body)
+
+
+def build_tile_store(kind: str = ZONE_TILE_STORE, local_dir: str = ZONE_TILE_LOCAL_DIR) -> TileStore:
+    if kind not in ZONE_TILE_STORES:
+        raise ValueError("Unsupported tile store: {}".format(kind))
+    if kind == "local":
+        return LocalTileStore(local_dir)
+    if kind == "mirror":
+        return MirroredTileStore(LocalTileStore(local_dir), S3TileStore())
+    return S3TileStore()
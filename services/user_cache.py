@@ -0,0 +1,53 @@
+import os
+import threading
+from cachetools import TTLCache
+from typing import Any, Optional
+
+from services.singleton.log import logger
+
+
+TAG = "UserCache ->"
+
+USER_CACHE_ENABLED = os.getenv("USER_CACHE_ENABLED", "true").lower() == "true"
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 15))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", 4096))
+
+
+class UserProfileCache:
+    """
+    Perfis de usuário por uuid, em memória e com TTL curto, para as rotas que só leem
+    o usuário autenticado. As escritas em crud_user/crud_occurrences invalidam a entrada
+    do próprio processo; nos outros workers ela expira pelo TTL.
+    """
+
+    def __init__(
+        self,
+        ttl: int = USER_CACHE_TTL,
+        max_entries: int = USER_CACHE_MAX_ENTRIES,
+        enabled: bool = USER_CACHE_ENABLED
+    ):
+        self.enabled = enabled
+        self.local = TTLCache(maxsize=max_entries, ttl=ttl)
+        self.lock = threading.Lock()
+
+    def get(self, uuid) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        with self.lock:
+            return self.local.get(str(uuid))
+
+    def set(self, uuid, profile: Any):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.local[str(uuid)] = profile
+
+    def invalidate(self, uuid):
+        with self.lock:
+            removed = self.local.pop(str(uuid), None)
+        if removed is not None:
+            logger.info("{} Invalidated user {}".format(TAG, uuid))
+
+    def clear(self):
+        with self.lock:
+            self.local.clear()
@@ -1,4 +1,5 @@
 import secrets
+import numpy as np
 from services.singleton.log import logger
 from geoalchemy2.elements import WKTElement
 from datetime import datetime
@@ -162,7 +163,24 @@ def determine_shift(datetime_str: str):
         return "Night"
     else:
         return "Down"
-    
+
+
+# Turno de cada hora do dia, na mesma regra de determine_shift
+SHIFT_BY_HOUR = np.array(["Down"] * 6 + ["Morning"] * 6 + ["Afternoon"] * 6 + ["Night"] * 6)
+
+
+def determine_shifts(datetime_strs) -> np.ndarray:
+    """determine_shift para um lote inteiro; ValueError se alguma data não estiver em "%Y-%m-%d %H:%M"."""
+    values = np.asarray(datetime_strs, dtype="U")
+    if values.size == 0:
+        return np.array([], dtype=SHIFT_BY_HOUR.dtype)
+    if values.dtype.itemsize != 16 * 4 or (values.view("U1").reshape(-1, 16)[:, 10] != " ").any():
+        raise ValueError("event_datetime must be formatted as %Y-%m-%d %H:%M")
+
+    minutes = values.astype("datetime64[m]")
+    hours = (minutes.astype("datetime64[h]") - minutes.astype("datetime64[D]")).astype(int)
+    return SHIFT_BY_HOUR[hours]
+
 
 def generate_token():
     return secrets.token_urlsafe(64)
\ No newline at end of file
@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import threading
+from cachetools import TTLCache
+from redis import Redis, RedisError
+from typing import Iterable, Optional
+
+from services.redis.redis import r_sync
+from services.cluster_store import cell_key
+from services.singleton.log import logger
+
+
+TAG = "ZoneCache ->"
+
+ZONE_CACHE_ENABLED = os.getenv("ZONE_CACHE_ENABLED", "true").lower() == "true"
+ZONE_CACHE_TTL = int(os.getenv("ZONE_CACHE_TTL", 60))
+ZONE_CACHE_MAX_ENTRIES = int(os.getenv("ZONE_CACHE_MAX_ENTRIES", 1024))
+ZONE_CACHE_PRECISION = int(os.getenv("ZONE_CACHE_PRECISION", 3))
+ZONE_CACHE_REDIS_BACKOFF = int(os.getenv("ZONE_CACHE_REDIS_BACKOFF", 30))
+ZONE_CACHE_PREFIX = "zone-result:"
+# Conjunto no Redis com as chaves de cada célula, para invalidar sem SCAN
+ZONE_CACHE_CELL_INDEX_PREFIX = "zone-cell-keys:"
+# Por quanto tempo depois de uma invalidação a célula é recalculada pelo primário
+# (deve cobrir o atraso de replicação das réplicas de leitura)
+ZONE_CACHE_PRIMARY_WINDOW = int(os.getenv("ZONE_CACHE_PRIMARY_WINDOW", 30))
+ZONE_CACHE_DIRTY_PREFIX = "zone-cell-dirty:"
+
+
+class ZoneResultCache:
+    """
+    Cache dos resultados de clusterização das rotas de zonas, em duas camadas: um LRU
+    em memória com TTL e, atrás dele, o Redis compartilhado entre os workers.
+    Guarda {"point_count": int, "features": list}. Falhas no Redis só desativam a
+    segunda camada.
+    """
+
+    def __init__(
+        self,
+        redis_client: Optional[Redis] = r_sync,
+        ttl: int = ZONE_CACHE_TTL,
+        max_entries: int = ZONE_CACHE_MAX_ENTRIES,
+        precision: int = ZONE_CACHE_PRECISION,
+        enabled: bool = ZONE_CACHE_ENABLED,
+        primary_window: int = ZONE_CACHE_PRIMARY_WINDOW
+    ):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.precision = precision
+        self.enabled = enabled
+        self.primary_window = primary_window
+        self.local = TTLCache(maxsize=max_entries, ttl=ttl)
+        self.dirty = TTLCache(maxsize=max_entries, ttl=primary_window)
+        self.lock = threading.Lock()
+        self.redis_retry_at = 0.0
+
+    def _redis_available(self) -> bool:
+        return self.redis is not None and time.monotonic() >= self.redis_retry_at
+
+    def _redis_failed(self, action: str, key: str, error: Exception):
+        # Evita pagar o timeout do Redis em toda requisição enquanto ele estiver fora
+        self.redis_retry_at = time.monotonic() + ZONE_CACHE_REDIS_BACKOFF
+        logger.error("{} Redis {} failed for {}: {}".format(TAG, action, key, error))
+
+    def _normalize(self, values: Iterable[str]) -> str:
+        return ",".join(sorted({value.lower() for value in values}))
+
+    def location_key(self, lat: float, lng: float, radius: float, recent_days: Optional[int] = None) -> str:
+        key = "loc:{}:{}:{}".format(round(lat, self.precision), round(lng, self.precision), radius)
+        if recent_days:
+            key += ":days={}".format(recent_days)
+        return key
+
+    def cell_key(self, cell_lat: float, cell_lng: float) -> str:
+        return "cell:{}:{}".format(round(cell_lat, 6), round(cell_lng, 6))
+
+    def key(self, spatial_key: str, occurrence_types: Iterable[str], shifts: Iterable[str], risk_levels: Iterable[str], eps: float, min_samples: int, backend: str) -> str:
+        return "{}{}|t={}|s={}|r={}|eps={}|min={}|b={}".format(
+            ZONE_CACHE_PREFIX,
+            spatial_key,
+            self._normalize(occurrence_types),
+            self._normalize(shifts),
+            self._normalize(risk_levels),
+            eps,
+            min_samples,
+            backend
+        )
+
+    def get(self, key: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+
+        with self.lock:
+            value = self.local.get(key)
+        if value is not None:
+            return value
+
+        if not self._redis_available():
+            return None
+        try:
+            data = self.redis.get(key)
+        except RedisError as e:
+            self._redis_failed("get", key, e)
+            return None
+        if data is None:
+            return None
+
+        value = json.loads(data)
+        with self.lock:
+            self.local[key] = value
+        return value
+
+    def _spatial_key(self, key: str) -> str:
+        return key[len(ZONE_CACHE_PREFIX):].split("|", 1)[0]
+
+    def set(self, key: str, value: dict):
+        if not self.enabled:
+            return
+
+        with self.lock:
+            self.local[key] = value
+
+        if not self._redis_available():
+            return
+        spatial_key = self._spatial_key(key)
+        try:
+            pipe = self.redis.pipeline()
+            pipe.setex(key, self.ttl, json.dumps(value))
+            if spatial_key.startswith("cell:"):
+                index_key = ZONE_CACHE_CELL_INDEX_PREFIX + spatial_key
+                pipe.sadd(index_key, key)
+                pipe.expire(index_key, self.ttl)
+            pipe.execute()
+        except RedisError as e:
+            self._redis_failed("set", key, e)
+
+    def invalidate_cell(self, cell_lat: float, cell_lng: float):
+        """
+        Remove todas as variações (filtros, backend) de uma célula de /remote-zones, em
+        memória e no Redis, e marca a célula por primary_window segundos para o próximo
+        cálculo ler do primário (recently_invalidated). A camada em memória dos outros
+        workers expira pelo TTL.
+        """
+        spatial_key = self.cell_key(cell_lat, cell_lng)
+        with self.lock:
+            for key in [key for key in self.local if self._spatial_key(key) == spatial_key]:
+                self.local.pop(key, None)
+            self.dirty[spatial_key] = True
+
+        if not self._redis_available():
+            return
+        index_key = ZONE_CACHE_CELL_INDEX_PREFIX + spatial_key
+        try:
+            self.redis.setex(ZONE_CACHE_DIRTY_PREFIX + spatial_key, self.primary_window, 1)
+            keys = self.redis.smembers(index_key)
+            self.redis.delete(index_key, *keys)
+        except RedisError as e:
+            self._redis_failed("invalidate", index_key, e)
+            return
+        logger.info("{} Invalidated cell {} ({} keys)".format(TAG, spatial_key, len(keys)))
+
+    def recently_invalidated(self, cell_lat: float, cell_lng: float) -> bool:
+        """
+        True se a célula foi invalidada (por qualquer worker) há menos de primary_window
+        segundos: uma réplica atrasada ainda pode devolver o estado anterior à escrita.
+        """
+        spatial_key = self.cell_key(cell_lat, cell_lng)
+        with self.lock:
+            if spatial_key in self.dirty:
+                return True
+
+        if not self._redis_available():
+            return False
+        try:
+            return self.redis.get(ZONE_CACHE_DIRTY_PREFIX + spatial_key) is not None
+        except RedisError as e:
+            self._redis_failed("get", ZONE_CACHE_DIRTY_PREFIX + spatial_key, e)
+            return False
+
+    def invalidate_occurrence(self, coordinates: list):
+        """Invalida a célula que contém uma ocorrência ([x, y], como Occurrence.coordinates)."""
+        self.invalidate_cell(cell_key(coordinates[1]), cell_key(coordinates[0]))
+
+    def clear(self):
+        with self.lock:
+            self.local.clear()
@@ -0,0 +1,205 @@
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from redis import Redis, RedisError
+from typing import Callable, Dict, Optional, Tuple
+
+from services.redis.redis import r_sync
+from services.zone_cache import ZoneResultCache
+from services.singleton.log import logger
+
+
+TAG = "ZoneSingleFlight ->"
+
+ZONE_SINGLE_FLIGHT_ENABLED = os.getenv("ZONE_SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+ZONE_LOCK_LEASE_MS = int(os.getenv("ZONE_LOCK_LEASE_MS", 5000))
+ZONE_LOCK_WAIT = float(os.getenv("ZONE_LOCK_WAIT", 6))
+ZONE_LOCK_POLL_INTERVAL = float(os.getenv("ZONE_LOCK_POLL_INTERVAL", 0.05))
+ZONE_LOCK_MAX_POLL_INTERVAL = float(os.getenv("ZONE_LOCK_MAX_POLL_INTERVAL", 0.5))
+ZONE_LOCK_REDIS_BACKOFF = int(os.getenv("ZONE_LOCK_REDIS_BACKOFF", 30))
+ZONE_LOCK_PREFIX = "zone-lock:"
+
+# Só apaga o lock se ele ainda for nosso (a lease pode ter expirado e ido para outro worker)
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Estende a lease só se o lock ainda for nosso
+RENEW_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class ZoneSingleFlight:
+    """
+    Um cálculo por célula/chave do zone_cache, mesmo com muitas requisições ao mesmo tempo.
+    No processo, quem chega com a mesma chave em andamento espera o Future de quem começou.
+    Entre workers e nós, um lock no Redis (SET NX com lease curta) elege quem calcula; uma
+    thread de heartbeat renova a lease enquanto o cálculo roda, então ela só vence se o
+    worker morrer. Os outros consultam o zone_cache com intervalo crescente (até
+    max_poll_interval) e, se a lease vencer sem resultado, disputam o lock de novo.
+    Sem Redis, ou passado ZONE_LOCK_WAIT, cada worker calcula.
+    """
+
+    def __init__(
+        self,
+        cache: ZoneResultCache,
+        redis_client: Optional[Redis] = r_sync,
+        lease_ms: int = ZONE_LOCK_LEASE_MS,
+        wait: float = ZONE_LOCK_WAIT,
+        poll_interval: float = ZONE_LOCK_POLL_INTERVAL,
+        max_poll_interval: float = ZONE_LOCK_MAX_POLL_INTERVAL,
+        enabled: bool = ZONE_SINGLE_FLIGHT_ENABLED
+    ):
+        self.cache = cache
+        self.redis = redis_client
+        self.lease_ms = lease_ms
+        self.wait = wait
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.enabled = enabled
+        self.calls: Dict[str, Future] = {}
+        self.lock = threading.Lock()
+        self.redis_retry_at = 0.0
+        self.counters = {"computed": 0, "coalesced": 0, "remote_results": 0, "lock_timeouts": 0}
+
+    def _count(self, counter: str):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def _redis_available(self) -> bool:
+        # O lock só faz sentido se o resultado for compartilhado pelo Redis do zone_cache
+        return self.redis is not None and self.cache.enabled and time.monotonic() >= self.redis_retry_at
+
+    def _redis_failed(self, action: str, key: str, error: Exception):
+        self.redis_retry_at = time.monotonic() + ZONE_LOCK_REDIS_BACKOFF
+        logger.error("{} Redis {} failed for {}: {}".format(TAG, action, key, error))
+
+    def _acquire(self, lock_key: str, token: str) -> bool:
+        """True se o lock é nosso ou se não há como coordenar pelo Redis."""
+        if not self._redis_available():
+            return True
+        try:
+            return bool(self.redis.set(lock_key, token, nx=True, px=self.lease_ms))
+        except RedisError as e:
+            self._redis_failed("lock", lock_key, e)
+            return True
+
+    def _release(self, lock_key: str, token: str):
+        if self.redis is None:
+            return
+        try:
+            self.redis.eval(RELEASE_SCRIPT, 1, lock_key, token)
+        except RedisError as e:
+            self._redis_failed("unlock", lock_key, e)
+
+    def _renew(self, lock_key: str, token: str) -> bool:
+        try:
+            return bool(self.redis.eval(RENEW_SCRIPT, 1, lock_key, token, self.lease_ms))
+        except RedisError as e:
+            self._redis_failed("renew", lock_key, e)
+            return False
+
+    def _heartbeat(self, lock_key: str, token: str, stop: threading.Event):
+        # Renova a cada terço da lease, com folga para um Redis lento antes de ela vencer
+        while not stop.wait(self.lease_ms / 3000):
+            if not self._renew(lock_key, token):
+                logger.error("{} Lost lock {} while computing".format(TAG, lock_key))
+                return
+
+    def _hold(self, lock_key: str, token: str) -> Optional[threading.Event]:
+        """Começa a renovar a lease; set() no Event devolvido para o heartbeat."""
+        if not self._redis_available():
+            # O lock não foi tomado no Redis (fora ou em backoff): não há lease para renovar
+            return None
+        stop = threading.Event()
+        threading.Thread(
+            target=self._heartbeat, args=(lock_key, token, stop), daemon=True, name="ZoneLockHeartbeat"
+        ).start()
+        return stop
+
+    def _compute_once(self, key: str, compute: Callable[[], dict]) -> Tuple[dict, bool]:
+        lock_key = ZONE_LOCK_PREFIX + key
+        token = uuid.uuid4().hex
+
+        acquired = self._acquire(lock_key, token)
+        deadline = time.monotonic() + self.wait
+        interval = self.poll_interval
+        while not acquired:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # Quem tem o lock está lento demais: calcula aqui em vez de segurar a requisição
+                self._count("lock_timeouts")
+                logger.error("{} Waited {}s for {}, computing without lock".format(TAG, self.wait, key))
+                break
+            # Backoff exponencial: cálculos longos não viram uma rajada de GETs no Redis
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, self.max_poll_interval)
+            value = self.cache.get(key)
+            if value is not None:
+                self._count("remote_results")
+                return value, False
+            acquired = self._acquire(lock_key, token)
+
+        heartbeat = self._hold(lock_key, token) if acquired else None
+        try:
+            # Outro worker pode ter terminado entre o nosso cache miss e o lock
+            value = self.cache.get(key)
+            if value is not None:
+                return value, False
+            value = compute()
+            self.cache.set(key, value)
+            self._count("computed")
+            return value, True
+        finally:
+            if heartbeat is not None:
+                heartbeat.set()
+            if acquired:
+                self._release(lock_key, token)
+
+    def run(self, key: str, compute: Callable[[], dict]) -> Tuple[dict, bool]:
+        """
+        Resultado de compute para a chave, calculado uma vez entre os concorrentes, e se
+        foi esta chamada que calculou (quem calcula é quem publica o tile).
+        """
+        if not self.enabled:
+            value = compute()
+            self.cache.set(key, value)
+            return value, True
+
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = Future()
+
+        if not leader:
+            self._count("coalesced")
+            try:
+                return future.result(timeout=self.wait), False
+            except FutureTimeoutError:
+                self._count("lock_timeouts")
+                return self._compute_once(key, compute)
+
+        try:
+            value, computed = self._compute_once(key, compute)
+            future.set_result(value)
+            return value, computed
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return dict(self.counters, in_flight=len(self.calls))
@@ -0,0 +1,100 @@
+import time
+import threading
+
+import pytest
+
+
+class FakeRedis:
+    """Subconjunto do redis-py usado por zone_cache e zone_single_flight, em memória, com TTL."""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.lock = threading.RLock()
+
+    def _live(self, key):
+        # Expiração preguiçosa, como a do Redis ao acessar a chave
+        deadline = self.expires.get(key)
+        if deadline is not None and time.monotonic() >= deadline:
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def _expire_in(self, key, ms):
+        if ms is None:
+            self.expires.pop(key, None)
+        else:
+            self.expires[key] = time.monotonic() + ms / 1000
+
+    def get(self, key):
+        with self.lock:
+            return self.data.get(key) if self._live(key) else None
+
+    def set(self, key, value, nx=False, px=None):
+        with self.lock:
+            if nx and self._live(key):
+                return None
+            self.data[key] = value
+            self._expire_in(key, px)
+            return True
+
+    def setex(self, key, ttl, value):
+        with self.lock:
+            self.data[key] = value
+            self._expire_in(key, ttl * 1000)
+
+    def sadd(self, key, *members):
+        with self.lock:
+            self._live(key)
+            self.data.setdefault(key, set()).update(members)
+
+    def smembers(self, key):
+        with self.lock:
+            return set(self.data[key]) if self._live(key) else set()
+
+    def expire(self, key, ttl):
+        self.pexpire(key, ttl * 1000)
+
+    def delete(self, *keys):
+        with self.lock:
+            return sum(self._live(key) and self.data.pop(key, None) is not None for key in keys)
+
+    def pexpire(self, key, ms):
+        with self.lock:
+            if not self._live(key):
+                return 0
+            self._expire_in(key, ms)
+            return 1
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def eval(self, script, numkeys, *args):
+        # Só os scripts de compare-and-delete / compare-and-pexpire do zone_single_flight
+        key, token = args[0], args[1]
+        with self.lock:
+            if self.get(key) != token:
+                return 0
+            if "pexpire" in script:
+                return self.pexpire(key, int(args[2]))
+            return self.delete(key)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return call
+
+    def execute(self):
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
@@ -0,0 +1,54 @@
+"""Conjuntos sintéticos de pontos (lng, lat) dentro de uma célula do grid, para os testes de clustering."""
+import numpy as np
+
+from services import geoloc
+
+
+# Célula de 0.1° no centro de São Paulo, no formato de Occurrence.coordinates: [x, y]
+CELL_X = -46.7
+CELL_Y = -23.6
+BOUNDS = (CELL_X, CELL_Y, CELL_X + geoloc.GRID_SIZE, CELL_Y + geoloc.GRID_SIZE)
+
+
+def uniform_points(n: int, rng: np.random.Generator, bounds=BOUNDS) -> np.ndarray:
+    min_x, min_y, max_x, max_y = bounds
+    return np.column_stack((rng.uniform(min_x, max_x, n), rng.uniform(min_y, max_y, n)))
+
+
+def hotspot_points(n: int, rng: np.random.Generator, bounds=BOUNDS, hotspots: int = 20, background: float = 0.2) -> np.ndarray:
+    """Manchas gaussianas de tamanhos variados sobre um fundo uniforme."""
+    min_x, min_y, max_x, max_y = bounds
+    n_background = int(n * background)
+    n_hotspots = n - n_background
+
+    centers = uniform_points(hotspots, rng, bounds)
+    sigmas = rng.uniform(0.001, 0.006, hotspots)
+    weights = rng.dirichlet(np.ones(hotspots))
+    which = rng.choice(hotspots, size=n_hotspots, p=weights)
+
+    points = centers[which] + rng.normal(0, 1, (n_hotspots, 2)) * sigmas[which, None]
+    points = np.vstack((points, uniform_points(n_background, rng, bounds)))
+    return np.clip(points, [min_x, min_y], [max_x, max_y])
+
+
+def corridor_points(n: int, rng: np.random.Generator, bounds=BOUNDS, corridors: int = 8, width: float = 0.0005) -> np.ndarray:
+    """Pontos ao longo de avenidas (segmentos) com um pequeno desvio lateral."""
+    min_x, min_y, max_x, max_y = bounds
+    starts = uniform_points(corridors, rng, bounds)
+    ends = uniform_points(corridors, rng, bounds)
+    which = rng.integers(0, corridors, n)
+    t = rng.uniform(0, 1, n)[:, None]
+
+    direction = ends[which] - starts[which]
+    length = np.linalg.norm(direction, axis=1, keepdims=True)
+    normal = np.column_stack((-direction[:, 1], direction[:, 0])) / np.where(length == 0, 1, length)
+
+    points = starts[which] + t * direction + normal * rng.normal(0, width, (n, 1))
+    return np.clip(points, [min_x, min_y], [max_x, max_y])
+
+
+DATASETS = {
+    "uniform": uniform_points,
+    "hotspots": hotspot_points,
+    "corridors": corridor_points,
+}
@@ -0,0 +1,36 @@
+import os
+import sys
+import subprocess
+
+import numpy as np
+
+from services.cluster_executor import ClusteringExecutor
+from services.clustering import ClusteringResult
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_worker_import_path_does_not_load_database():
+    # Mesmo caminho do processo spawn: importa o módulo de _cluster_job e roda o job
+    code = (
+        "import sys, numpy as np\n"
+        "from services.cluster_executor import _cluster_job\n"
+        "_cluster_job(np.zeros((3, 2)), 1, 2, [], 'kdtree')\n"
+        "print(sorted(m for m in ('database', 'models.models', 'services.geoloc') if m in sys.modules))\n"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+
+    assert out.stdout.strip().splitlines()[-1] == "[]"
+
+
+def test_pool_returns_the_inline_result():
+    rng = np.random.default_rng(1)
+    points = np.array([-46.7, -23.6]) + rng.normal(0, 0.002, (300, 2))
+    executor = ClusteringExecutor(workers=1, min_points=10)
+    try:
+        features = executor.generate_geojson_cluster_polygons(points, 0.1, 3)
+    finally:
+        executor.shutdown()
+
+    assert features == ClusteringResult().generate_geojson_cluster_polygons(points, 0.1, 3)
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from services import cluster_store, geoloc
+from services.cluster_store import CellClusters, IncrementalClusterStore, cell_key
+from synthetic_points import DATASETS
+
+
+def reference(points, eps=1, min_samples=2, engine="kdtree"):
+    clustering = geoloc.ClusteringResult(engine)
+    return clustering.dbscan(points, eps, min_samples), clustering.generate_geojson_cluster_polygons(points, eps, min_samples)
+
+
+@pytest.mark.parametrize("dataset", sorted(DATASETS))
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_bulk_load_matches_clustering_result(dataset, seed):
+    points = DATASETS[dataset](3000, np.random.default_rng(seed))
+    labels, features = reference(points, eps=0.2, min_samples=4)
+
+    cell = CellClusters(points, 0.2, 4)
+
+    assert cell.labels[:cell.size].tolist() == labels
+    assert cell.features() == features
+
+
+@pytest.mark.parametrize("engine", ["numpy", "python"])
+def test_bulk_load_matches_other_engines(engine):
+    points = DATASETS["hotspots"](400, np.random.default_rng(7))
+    labels, features = reference(points, eps=0.3, min_samples=3, engine=engine)
+
+    cell = CellClusters(points, 0.3, 3)
+
+    assert cell.labels[:cell.size].tolist() == labels
+    assert cell.features() == features
+
+
+@pytest.mark.parametrize("dataset", sorted(DATASETS))
+def test_inserts_match_clustering_result(dataset):
+    points = DATASETS[dataset](1500, np.random.default_rng(11))
+    cell = CellClusters(points[:1000], 0.2, 4)
+
+    for i in range(1000, len(points)):
+        cell.insert(points[i])
+        if i % 100 == 0 or i == len(points) - 1:
+            labels, features = reference(points[:i + 1], eps=0.2, min_samples=4)
+            assert cell.labels[:cell.size].tolist() == labels
+            assert cell.features() == features
+
+
+def test_corridor_is_not_merged_by_chaining():
+    rng = np.random.default_rng(5)
+    t = np.linspace(0, 1, 120)[:, None]
+    points = np.array([-46.7, -23.6]) + t * np.array([0.08, 0.0]) + rng.normal(0, 0.0002, (120, 2))
+
+    cell = CellClusters(points, 1, 2)
+
+    assert cell.features() == reference(points)[1]
+
+
+def test_discard_occurrence_evicts_its_cell():
+    store = IncrementalClusterStore()
+    points = DATASETS["hotspots"](50, np.random.default_rng(3))
+    x, y = points[0]
+    key = store._key(cell_key(y), cell_key(x))
+    store.cells[key] = CellClusters(points, 1, 2)
+    other = store._key(cell_key(y) + 1, cell_key(x))
+    store.cells[other] = CellClusters(points, 1, 2)
+
+    store.discard_occurrence([float(x), float(y)])
+
+    assert key not in store.cells
+    assert other in store.cells
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_every_insert_matches_clustering_result(monkeypatch, seed):
+    # Árvore refeita a cada poucas inserções e pontos repetidos, para exercitar a cauda e as cascatas
+    monkeypatch.setattr(cluster_store, "CELL_TREE_MAX_TAIL", 7)
+    rng = np.random.default_rng(seed)
+    points = np.array([-46.7, -23.6]) + rng.normal(0, rng.choice([0.002, 0.01, 0.03]), (200, 2))
+    points[rng.integers(0, 200, 40)] = points[rng.integers(0, 200, 40)]
+    eps, min_samples = float(rng.choice([0.1, 0.3, 0.8])), int(rng.integers(1, 7))
+
+    cell = CellClusters(points[:50], eps, min_samples)
+    for i in range(50, len(points)):
+        cell.insert(points[i])
+        labels, features = reference(points[:i + 1], eps=eps, min_samples=min_samples)
+        assert cell.labels.tolist() == labels
+        assert cell.features() == features
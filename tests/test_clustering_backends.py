@@ -0,0 +1,49 @@
+import numpy as np
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+from services import geoloc
+from services.zone_cache import ZoneResultCache
+
+
+def density_connected_labels(points, eps, min_samples):
+    """DBSCAN padrão (o de ST_ClusterDBSCAN), só para comparar a semântica."""
+    clustering = geoloc.ClusteringResult()
+    coords = np.asarray(points, dtype=np.float64)
+    xyz = clustering.unit_vectors(coords)
+    tree = cKDTree(xyz)
+    neighbors = tree.query_ball_point(xyz, clustering.chord_radius(eps))
+    core = np.array([len(n) >= min_samples for n in neighbors])
+
+    graph = tree.sparse_distance_matrix(tree, clustering.chord_radius(eps)).tocsr()
+    core_graph = graph[core][:, core]
+    _, components = connected_components(core_graph, directed=False)
+    labels = np.full(len(coords), -1)
+    labels[np.flatnonzero(core)] = components + 1
+    for i in np.flatnonzero(~core):
+        cores = [j for j in neighbors[i] if core[j]]
+        if cores:
+            labels[i] = labels[cores[0]]
+    return labels
+
+
+def test_app_engines_do_not_chain_like_postgis():
+    # Uma avenida de 8 km com um ponto a cada ~70 m: encadeada, vira um cluster só
+    t = np.linspace(0, 0.08, 120)
+    points = np.column_stack((-23.6 + np.zeros_like(t), -46.7 + t))
+
+    app_labels = np.array(geoloc.ClusteringResult().dbscan(points, 1, 2))
+    postgis_labels = density_connected_labels(points, 1, 2)
+
+    assert len(set(postgis_labels.tolist()) - {-1}) == 1
+    assert len(set(app_labels.tolist()) - {-1}) > 1
+
+
+def test_backends_never_share_zone_cache_entries():
+    cache = ZoneResultCache(redis_client=None)
+    spatial_key = cache.cell_key(-23.6, -46.7)
+
+    app_key = cache.key(spatial_key, [], [], [], 1, 2, "app")
+    postgis_key = cache.key(spatial_key, [], [], [], 1, 2, "postgis")
+
+    assert app_key != postgis_key
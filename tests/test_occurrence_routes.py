@@ -0,0 +1,35 @@
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routers import occurrence
+from services.auth import verify_token
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(occurrence.router, prefix="/api")
+    app.dependency_overrides[verify_token] = lambda: "user-uuid"
+    return TestClient(app)
+
+
+def test_export_rejects_a_bad_cursor_before_streaming(client):
+    resp = client.get("/api/occurrences/export", params={"cursor": "bad!!"})
+
+    assert resp.status_code == 400
+    assert resp.json() == {"detail": "Invalid cursor"}
+
+
+def test_filters_hand_over_the_decoded_cursor():
+    class Row:
+        created_at = datetime(2026, 10, 1, 12, 0)
+        id = 42
+
+    cursor = occurrence.crud_occurrences.encode_cursor(Row)
+
+    filters = occurrence.occurrence_filters(cursor=cursor, swLat=None, swLng=None, neLat=None, neLng=None, occurrenceType=[], shifts=[])
+
+    assert filters["cursor"] == (Row.created_at, 42)
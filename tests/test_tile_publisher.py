@@ -0,0 +1,121 @@
+import time
+import threading
+
+from services.tile_publisher import ZoneTilePublisher
+from services.tile_store import LocalTileStore, TileStore
+
+
+class StubStore(TileStore):
+    """Store em memória que falha as primeiras `failures` gravações e pode segurar as outras."""
+
+    def __init__(self, failures: int = 0, delay: float = 0):
+        self.failures = failures
+        self.delay = delay
+        self.puts = []
+        self.bodies = {}
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    async def fetch(self, key):
+        return self.bodies.get(key)
+
+    def put(self, key, body):
+        self.started.set()
+        self.gate.wait()
+        time.sleep(self.delay)
+        self.puts.append(key)
+        if self.failures:
+            self.failures -= 1
+            raise OSError("store unavailable")
+        self.bodies[key] = body
+
+
+def publisher(store, **kwargs):
+    kwargs.setdefault("workers", 1)
+    kwargs.setdefault("retry_backoff", 0)
+    return ZoneTilePublisher(store, **kwargs)
+
+
+def hold(store, pub):
+    # Ocupa o único worker até store.gate ser liberado
+    store.gate.clear()
+    pub.publish("zones/busy.json", "[]")
+    assert store.started.wait(2)
+
+
+def test_publishes_to_a_local_store(tmp_path):
+    store = LocalTileStore(str(tmp_path))
+    pub = publisher(store)
+
+    assert pub.publish("zones/zone_1_2.json", '[{"a": 1}]')
+    assert pub.flush(2)
+
+    assert (tmp_path / "zones" / "zone_1_2.json").read_bytes() == b'[{"a": 1}]'
+    assert pub.stats()["published"] == 1
+
+
+def test_repeated_key_in_the_queue_uploads_the_latest_body_once():
+    store = StubStore()
+    pub = publisher(store)
+    hold(store, pub)
+
+    pub.publish("zones/zone_1_2.json", "[1]")
+    pub.publish("zones/zone_1_2.json", "[2]")
+    store.gate.set()
+    assert pub.flush(2)
+
+    assert store.puts.count("zones/zone_1_2.json") == 1
+    assert store.bodies["zones/zone_1_2.json"] == "[2]"
+    assert pub.stats()["coalesced"] == 1
+
+
+def test_failed_writes_are_retried():
+    store = StubStore(failures=2)
+    pub = publisher(store, max_retries=3)
+
+    pub.publish("zones/zone_1_2.json", "[1]")
+    assert pub.flush(2)
+
+    assert store.bodies["zones/zone_1_2.json"] == "[1]"
+    assert pub.stats()["retries"] == 2
+    assert pub.stats()["published"] == 1
+
+
+def test_gives_up_after_max_retries():
+    store = StubStore(failures=5)
+    pub = publisher(store, max_retries=2)
+
+    pub.publish("zones/zone_1_2.json", "[1]")
+    assert pub.flush(2)
+
+    assert len(store.puts) == 3
+    assert pub.stats()["failed"] == 1
+    assert pub.stats()["published"] == 0
+
+
+def test_full_queue_drops_the_tile():
+    store = StubStore()
+    pub = publisher(store, max_queue=1)
+    hold(store, pub)
+
+    assert pub.publish("zones/zone_1_2.json", "[1]")
+    assert not pub.publish("zones/zone_3_4.json", "[2]")
+    store.gate.set()
+    assert pub.flush(2)
+
+    assert "zones/zone_3_4.json" not in store.bodies
+    assert pub.stats()["dropped"] == 1
+
+
+def test_close_waits_for_queued_tiles():
+    store = StubStore(delay=0.02)
+    pub = publisher(store, batch_size=2)
+    keys = ["zones/zone_{}_0.json".format(i) for i in range(10)]
+    for key in keys:
+        pub.publish(key, "[1]")
+
+    pub.close(timeout=5)
+
+    assert sorted(store.bodies) == sorted(keys)
+    assert pub.stats()["queued"] == 0
@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from services.tile_store import LocalTileStore, TileStore, tile_is_empty
+
+
+def test_tile_store_is_abstract():
+    with pytest.raises(TypeError):
+        TileStore()
+
+
+def test_local_fetch_returns_a_view_of_the_mapping(tmp_path):
+    store = LocalTileStore(str(tmp_path), max_open=1)
+    store.put("zones/zone_1_2.json", '[{"a": 1}]')
+
+    body = asyncio.run(store.fetch("zones/zone_1_2.json"))
+
+    assert isinstance(body, memoryview)
+    assert body.tobytes() == b'[{"a": 1}]'
+
+    # Substituir o arquivo e tirar o mapeamento do LRU não invalida a view em uso
+    store.put("zones/zone_1_2.json", '[{"a": 2}]')
+    store.put("zones/zone_3_4.json", '[{"b": 1}]')
+    assert asyncio.run(store.fetch("zones/zone_1_2.json")).tobytes() == b'[{"a": 2}]'
+    assert asyncio.run(store.fetch("zones/zone_3_4.json")).tobytes() == b'[{"b": 1}]'
+    assert body.tobytes() == b'[{"a": 1}]'
+
+
+def test_empty_tiles_are_missing(tmp_path):
+    store = LocalTileStore(str(tmp_path))
+    store.put("zones/zone_5_6.json", "[]")
+
+    assert asyncio.run(store.fetch("zones/zone_5_6.json")) is None
+    assert asyncio.run(store.fetch("zones/missing.json")) is None
+    assert tile_is_empty(memoryview(b" {} "))
+    assert not tile_is_empty(memoryview(b'[{"a": 1}]'))
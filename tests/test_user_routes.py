@@ -0,0 +1,68 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Os singletons de e-mail exigem as variáveis no import; nada é enviado nestes testes
+for name in ("SES_SMTP_USERNAME", "SES_SMTP_PASSWORD", "SES_EMAIL_ADDRESS", "HOSTINGER_EMAIL_HOST",
+             "HOSTINGER_EMAIL_PORT", "HOSTINGER_EMAIL_ADDRESS", "HOSTINGER_EMAIL_PASSWORD"):
+    os.environ.setdefault(name, "test")
+
+from database import get_async_db
+from models import models
+from routers import user
+
+
+class FakeAsyncSession:
+    """Só o que a rota de exclusão usa: busca do usuário por e-mail e gravação do pedido."""
+
+    def __init__(self, users):
+        self.users = users
+        self.added = []
+        self.commits = 0
+
+    async def scalar(self, statement):
+        email = statement.whereclause.right.value
+        return next((u for u in self.users if u.email == email), None)
+
+    def add(self, obj):
+        self.added.append(obj)
+
+    async def commit(self):
+        self.commits += 1
+
+    async def refresh(self, obj):
+        obj.id = len(self.added)
+
+
+@pytest.fixture
+def session():
+    return FakeAsyncSession([SimpleNamespace(id=7, email="ana@example.com")])
+
+
+@pytest.fixture
+def client(session):
+    app = FastAPI()
+    app.include_router(user.router, prefix="/api")
+    app.dependency_overrides[get_async_db] = lambda: session
+    return TestClient(app)
+
+
+def test_exclusion_request_is_stored_for_the_user(client, session):
+    resp = client.request("DELETE", "/api/users/exlusion", json={"email": "ana@example.com", "reason": "Não uso mais"})
+
+    assert resp.status_code == 200
+    assert resp.json()["status"] is True
+    [request] = session.added
+    assert isinstance(request, models.UserExclusionRequest)
+    assert (request.user_id, request.reason) == (7, "Não uso mais")
+    assert session.commits == 1
+
+
+def test_exclusion_request_for_unknown_email(client, session):
+    resp = client.request("DELETE", "/api/users/exlusion", json={"email": "nobody@example.com", "reason": "x"})
+
+    assert resp.status_code == 404
+    assert session.added == []
@@ -0,0 +1,50 @@
+import time
+
+from services.zone_cache import ZoneResultCache
+
+
+def test_invalidate_occurrence_drops_every_variant_of_the_cell(fake_redis):
+    cache = ZoneResultCache(redis_client=fake_redis)
+    cell = cache.cell_key(-23.6, -46.7)
+    other_cell = cache.cell_key(-23.5, -46.7)
+    keys = [
+        cache.key(cell, [], [], [], 1, 2, "app"),
+        cache.key(cell, ["Theft"], ["Night"], ["high"], 1, 2, "postgis"),
+    ]
+    other = cache.key(other_cell, [], [], [], 1, 2, "app")
+    for key in keys + [other]:
+        cache.set(key, {"point_count": 1, "features": []})
+
+    # [x, y] como Occurrence.coordinates, dentro da célula (-23.6, -46.7)
+    cache.invalidate_occurrence([-46.65, -23.55])
+
+    for key in keys:
+        assert cache.get(key) is None
+        assert fake_redis.get(key) is None
+    assert cache.get(other) is not None
+
+
+def test_invalidated_cell_is_not_refilled_from_redis(fake_redis):
+    cache = ZoneResultCache(redis_client=fake_redis)
+    other_worker = ZoneResultCache(redis_client=fake_redis)
+    key = cache.key(cache.cell_key(-23.6, -46.7), [], [], [], 1, 2, "app")
+    other_worker.set(key, {"point_count": 1, "features": []})
+
+    cache.invalidate_cell(-23.6, -46.7)
+
+    assert cache.get(key) is None
+
+
+def test_invalidated_cell_reads_from_the_primary_for_a_while(fake_redis):
+    cache = ZoneResultCache(redis_client=fake_redis, primary_window=1)
+    other_worker = ZoneResultCache(redis_client=fake_redis, primary_window=1)
+
+    cache.invalidate_occurrence([-46.65, -23.55])
+
+    assert cache.recently_invalidated(-23.6, -46.7)
+    assert other_worker.recently_invalidated(-23.6, -46.7)
+    assert not other_worker.recently_invalidated(-23.5, -46.7)
+
+    time.sleep(1.1)
+    assert not cache.recently_invalidated(-23.6, -46.7)
+    assert not other_worker.recently_invalidated(-23.6, -46.7)
@@ -0,0 +1,43 @@
+import time
+import threading
+
+from services.zone_cache import ZoneResultCache
+from services.zone_single_flight import ZoneSingleFlight, ZONE_LOCK_PREFIX
+
+
+def worker(fake_redis, lease_ms=100):
+    # Cada worker tem o seu zone_cache local; só o Redis é compartilhado
+    return ZoneSingleFlight(ZoneResultCache(redis_client=fake_redis), redis_client=fake_redis, lease_ms=lease_ms, wait=3, poll_interval=0.01)
+
+
+def test_compute_slower_than_the_lease_runs_once(fake_redis):
+    workers = [worker(fake_redis), worker(fake_redis)]
+    key = workers[0].cache.key(workers[0].cache.cell_key(-23.6, -46.7), [], [], [], 1, 2, "app")
+    calls = []
+
+    def compute():
+        calls.append(threading.get_ident())
+        time.sleep(0.4)
+        return {"point_count": 1, "features": []}
+
+    results = []
+    threads = [threading.Thread(target=lambda w=w: results.append(w.run(key, compute))) for w in workers]
+    threads[0].start()
+    time.sleep(0.02)
+    threads[1].start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(computed for _, computed in results) == [False, True]
+    assert workers[1].stats()["remote_results"] == 1
+    assert fake_redis.get(ZONE_LOCK_PREFIX + key) is None
+
+
+def test_lease_expires_if_the_holder_stops_renewing(fake_redis):
+    flight = worker(fake_redis)
+    fake_redis.set(ZONE_LOCK_PREFIX + "k", "dead-worker", nx=True, px=50)
+
+    time.sleep(0.1)
+
+    assert flight._acquire(ZONE_LOCK_PREFIX + "k", "token")
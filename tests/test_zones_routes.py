@@ -0,0 +1,47 @@
+from contextlib import contextmanager
+
+import pytest
+
+from routers import zones
+from services.zone_cache import ZoneResultCache
+from services.zone_single_flight import ZoneSingleFlight
+
+
+@pytest.fixture
+def route(monkeypatch, fake_redis):
+    """remote_zones_response com cache e single flight em memória e sessões marcadas."""
+    cache = ZoneResultCache(redis_client=fake_redis)
+    sessions = []
+
+    @contextmanager
+    def primary_session():
+        yield "primary"
+
+    def compute(db, *args):
+        sessions.append(db)
+        return 3, [{"type": "Feature"}]
+
+    monkeypatch.setattr(zones, "zone_cache", cache)
+    monkeypatch.setattr(zones, "zone_single_flight", ZoneSingleFlight(cache, redis_client=fake_redis))
+    monkeypatch.setattr(zones, "SessionLocal", primary_session)
+    monkeypatch.setattr(zones.rollups, "cell_count", lambda db, *args: 3)
+    monkeypatch.setattr(zones, "compute_remote_zones", compute)
+    monkeypatch.setattr(zones.tile_publisher, "publish", lambda key, body: True)
+    monkeypatch.setattr(zones.tile_store, "remember", lambda key, body: None)
+
+    def call():
+        return zones.remote_zones_response("replica", "app", -23.6, -46.7, "zones/zone_-2360_-4670.json", [], [], [])
+
+    return cache, sessions, call
+
+
+def test_recompute_after_invalidation_reads_the_primary(route):
+    cache, sessions, call = route
+
+    call()
+    cache.invalidate_cell(-23.6, -46.7)
+    call()
+    call()
+
+    # Só o recálculo depois da escrita vai ao primário; o seguinte sai do cache
+    assert sessions == ["replica", "primary"]